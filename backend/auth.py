@@ -1,11 +1,67 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+# bcrypt work factor for new hashes. Raising it takes effect for existing
+# players on their next login (see needs_rehash).
+BCRYPT_ROUNDS = int(os.environ.get("CONGEST_BCRYPT_ROUNDS", 12))
+# Hashes run on their own small pool so a login burst can use at most this
+# many cores and never occupies the threads that serve gameplay routes.
+# bcrypt releases the GIL, so threads are enough.
+PASSWORD_WORKERS = int(os.environ.get("CONGEST_PASSWORD_WORKERS", 2))
+# Hashes allowed to wait for a worker; beyond that requests fail fast with
+# PasswordQueueFull instead of queueing up seconds of latency.
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("CONGEST_PASSWORD_QUEUE_LIMIT", 16))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PasswordQueueFull(Exception):
+    pass
+
 
 def hash_password(password: str) -> str:
     # bcrypt hashes at most 72 bytes; longer input is truncated (matching the
     # previous passlib default) so hashing never errors on a long password.
-    return bcrypt.hashpw(password.encode("utf-8")[:72], bcrypt.gensalt()).decode("utf-8")
+    return bcrypt.hashpw(
+        password.encode("utf-8")[:72], bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    ).decode("utf-8")
 
 
 def verify_password(password: str, hash_: str) -> bool:
     return bcrypt.checkpw(password.encode("utf-8")[:72], hash_.encode("utf-8"))
+
+
+def needs_rehash(hash_: str) -> bool:
+    """True if `hash_` was made with a different work factor than BCRYPT_ROUNDS."""
+    # Format: $2b$<rounds>$<salt and hash>
+    parts = hash_.split("$")
+    return len(parts) < 3 or not parts[2].isdigit() or int(parts[2]) != BCRYPT_ROUNDS
+
+
+async def _run_bounded(fn, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT:
+            raise PasswordQueueFull()
+        _pending += 1
+    try:
+        return await asyncio.wrap_future(_executor.submit(fn, *args))
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the bounded pool. Raises PasswordQueueFull."""
+    return await _run_bounded(hash_password, password)
+
+
+async def verify_password_async(password: str, hash_: str) -> bool:
+    """verify_password on the bounded pool. Raises PasswordQueueFull."""
+    return await _run_bounded(verify_password, password, hash_)
@@ -0,0 +1,77 @@
+"""
+Caches on the authentication hot path.
+
+- token_cache maps an already verified access token to its player id, so
+  repeat requests skip the JWT signature check and the username lookup.
+  Entries never outlive the token's own expiry.
+- profile_cache holds the player's package_data() for /api/me. Every write
+  to a player drops its entry (see main._player_changed).
+
+Both are per process. With several workers a write or account deletion is
+only seen by the other workers' caches once their entries expire, so the
+profile TTL is kept short; routes that load the Player row still notice a
+deleted account immediately.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+AUTH_CACHE_TTL_SECONDS = int(os.environ.get("CONGEST_AUTH_CACHE_TTL", 300))
+PROFILE_CACHE_TTL_SECONDS = int(os.environ.get("CONGEST_PROFILE_CACHE_TTL", 30))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("CONGEST_AUTH_CACHE_SIZE", 10000))
+
+
+class TTLCache:
+    """Least-recently-used map whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = metrics.counter(f"congest_{name}_cache_hits_total", f"{name} cache hits")
+        self.misses = metrics.counter(f"congest_{name}_cache_misses_total", f"{name} cache misses")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits.inc()
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self.misses.inc()
+        return None
+
+    def put(self, key, value, expires_at: float | None = None):
+        """Store `value`, expiring after the TTL or at the unix time
+        `expires_at`, whichever comes first."""
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[key] = (deadline, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def pop_value(self, value):
+        """Drop every entry holding `value`. Linear, for rare events only."""
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if v == value]:
+                del self._entries[key]
+
+
+token_cache = TTLCache("auth_token", AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
+profile_cache = TTLCache("profile", PROFILE_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
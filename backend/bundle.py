@@ -0,0 +1,332 @@
+"""
+Compiled network bundle.
+
+`python -m backend.bundle` compiles every level in levels/ and every network
+in generated_networks/ into one flat binary file, so the server can start
+and serve networks without parsing any JSON. All per-node and per-line
+values are stored as concatenated 1-D arrays, with `*_start` offset arrays
+marking where each network's slice begins (CSR style):
+
+- nodes: id, injection, x, y, cost_increase, cost_decrease
+- lines: id, from/to node and from/to bus index (local to the network),
+  line index, limit and the precomputed initial flow
+- per network: key, level, difficulty, cost, tutorial text and source mtime
+
+With `--solutions`, the auto-solver is also run on the initial state of
+every level and daily network, and each zero-cost result is stored as one
+more network under the key "solution:<key>" (see NetworkBundle.solution).
+
+File layout: an 8-byte magic, a little-endian uint32 array count, a table
+of contents (name, dtype, offset, length) and the array data, each array
+aligned to 64 bytes. open_bundle() memory-maps the file and every array is
+a zero-copy view into the mapping.
+"""
+import os
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from .schemas import Node, Line, NetworkState, dict_to_network_state
+from .network import read_level_file, solve_network
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_PATH = Path("build/networks.bundle")
+
+_MAGIC = b"CGBNDL2\0"
+_ALIGN = 64
+_TOC_DTYPE = np.dtype(
+    [("name", "S24"), ("dtype", "S8"), ("offset", "<u8"), ("length", "<u8")]
+)
+
+
+def _source_files() -> list[tuple[str, Path]]:
+    """(key, path) for every network compiled into the bundle."""
+    sources = []
+    for path in Path("levels").glob("Level*.json"):
+        sources.append((f"level:{path.stem[len('Level'):]}", path))
+    for path in sorted(Path("generated_networks").glob("network_*.json")):
+        sources.append((f"generated:{path.stem}", path))
+    for path in sorted(Path("generated_networks/daily").glob("*.json")):
+        sources.append((f"daily:{path.stem}", path))
+    return sources
+
+
+def _initial_state(key: str, path: Path) -> NetworkState:
+    # Same initial state each network is served in: levels are reset and
+    # power-flowed, generated networks are served as stored.
+    if key.startswith("level:"):
+        return read_level_file(str(path))
+    with open(path) as f:
+        return dict_to_network_state(json.load(f))
+
+
+def _networks(solutions: bool):
+    """(key, source mtime, network) for everything to compile."""
+    for key, path in _source_files():
+        network = _initial_state(key, path)
+        mtime = path.stat().st_mtime
+        yield key, mtime, network
+        if solutions and not key.startswith("generated:"):
+            solution = solve_network(network)
+            if solution.cost == 0:
+                yield f"solution:{key}", mtime, solution
+            else:
+                logger.warning("No solution found for %s, not storing one", key)
+
+
+def build_bundle(out_path: Path = BUNDLE_PATH, solutions: bool = False) -> int:
+    """Compile all source networks (and with `solutions`, their precomputed
+    solutions) into `out_path`. Returns the network count."""
+    keys, levels, difficulties, costs, mtimes = [], [], [], [], []
+    tutorials = []
+    node_start, line_start = [0], [0]
+    node_ids, injections, xs, ys, cost_inc, cost_dec = [], [], [], [], [], []
+    line_ids, line_from, line_to, limits, flows = [], [], [], [], []
+    line_from_bus, line_to_bus, line_index = [], [], []
+
+    for key, mtime, network in _networks(solutions):
+        id_to_idx = {node_id: i for i, node_id in enumerate(network.nodes)}
+
+        keys.append(key)
+        levels.append(network.level if network.level is not None else -1)
+        difficulties.append(network.difficulty or "")
+        costs.append(network.cost)
+        mtimes.append(mtime)
+        tutorials.append((network.tutorial_info or "").encode("utf-8"))
+
+        for node in network.nodes.values():
+            node_ids.append(node.id)
+            injections.append(node.injection)
+            xs.append(node.x)
+            ys.append(node.y)
+            cost_inc.append(node.cost_increase)
+            cost_dec.append(node.cost_decrease)
+        for line in network.lines.values():
+            line_ids.append(line.id)
+            line_from.append(id_to_idx[line.from_node])
+            line_to.append(id_to_idx[line.to_node])
+            line_from_bus.append(id_to_idx[line.from_bus])
+            line_to_bus.append(id_to_idx[line.to_bus])
+            line_index.append(line.index)
+            limits.append(line.limit)
+            flows.append(line.flow)
+
+        node_start.append(len(node_ids))
+        line_start.append(len(line_ids))
+
+    tutorial_start = np.cumsum([0] + [len(t) for t in tutorials], dtype=np.int64)
+    arrays = {
+        "key": _strings(keys),
+        "level": np.array(levels, dtype=np.int32),
+        "difficulty": _strings(difficulties),
+        "cost": np.array(costs, dtype=np.float64),
+        "source_mtime": np.array(mtimes, dtype=np.float64),
+        "tutorial": np.frombuffer(b"".join(tutorials), dtype=np.uint8),
+        "tutorial_start": tutorial_start,
+        "node_start": np.array(node_start, dtype=np.int64),
+        "line_start": np.array(line_start, dtype=np.int64),
+        "node_id": _strings(node_ids),
+        "injection": np.array(injections, dtype=np.float64),
+        "x": np.array(xs, dtype=np.float64),
+        "y": np.array(ys, dtype=np.float64),
+        "cost_increase": np.array(cost_inc, dtype=np.int32),
+        "cost_decrease": np.array(cost_dec, dtype=np.int32),
+        "line_id": _strings(line_ids),
+        "line_from": np.array(line_from, dtype=np.int32),
+        "line_to": np.array(line_to, dtype=np.int32),
+        "line_from_bus": np.array(line_from_bus, dtype=np.int32),
+        "line_to_bus": np.array(line_to_bus, dtype=np.int32),
+        "line_index": np.array(line_index, dtype=np.int32),
+        "limit": np.array(limits, dtype=np.float64),
+        "flow": np.array(flows, dtype=np.float64),
+    }
+    _write(out_path, arrays)
+    return len(keys)
+
+
+def is_current(path: Path = BUNDLE_PATH) -> bool:
+    """True if `path` holds every source network, compiled from its
+    current file."""
+    bundle = open_bundle(path)
+    return bundle is not None and all(
+        bundle.is_fresh(key, source.stat().st_mtime) for key, source in _source_files()
+    )
+
+
+def _strings(values: list[str]) -> np.ndarray:
+    """Fixed-width bytes array as wide as the longest value: numpy would
+    silently truncate anything longer than a fixed dtype."""
+    encoded = [value.encode("utf-8") for value in values]
+    return np.array(encoded, dtype=f"S{max(map(len, encoded), default=1) or 1}")
+
+
+def _write(out_path: Path, arrays: dict[str, np.ndarray]):
+    toc = np.zeros(len(arrays), dtype=_TOC_DTYPE)
+    header_size = len(_MAGIC) + 4 + toc.nbytes
+    offset = -(-header_size // _ALIGN) * _ALIGN
+    for i, (name, arr) in enumerate(arrays.items()):
+        toc[i] = (name.encode(), arr.dtype.str.encode(), offset, arr.size)
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(np.uint32(len(arrays)).tobytes())
+        f.write(toc.tobytes())
+        for entry, arr in zip(toc, arrays.values()):
+            f.seek(int(entry["offset"]))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(max(f.tell(), offset))
+    # Atomic replace: processes that already mapped the old file keep it.
+    os.replace(tmp_path, out_path)
+
+
+class NetworkBundle:
+    """Read-only view of a compiled bundle; see the module docstring."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._buf = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._buf[: len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not a network bundle")
+        count = int(self._buf[len(_MAGIC): len(_MAGIC) + 4].view("<u4")[0])
+        toc_start = len(_MAGIC) + 4
+        toc = self._buf[toc_start: toc_start + count * _TOC_DTYPE.itemsize].view(_TOC_DTYPE)
+        self._arrays: dict[str, np.ndarray] = {}
+        for entry in toc:
+            dtype = np.dtype(entry["dtype"].decode())
+            start = int(entry["offset"])
+            stop = start + int(entry["length"]) * dtype.itemsize
+            self._arrays[entry["name"].decode()] = self._buf[start:stop].view(dtype)
+        self.index = {
+            key.decode(): i for i, key in enumerate(self._arrays["key"])
+        }
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def is_fresh(self, key: str, mtime: float) -> bool:
+        """True if `key` was compiled from a source file with this mtime."""
+        i = self.index.get(key)
+        return i is not None and self["source_mtime"][i] == mtime
+
+    def nodes_slice(self, key: str) -> slice:
+        i = self.index[key]
+        start = self["node_start"]
+        return slice(int(start[i]), int(start[i + 1]))
+
+    def lines_slice(self, key: str) -> slice:
+        i = self.index[key]
+        start = self["line_start"]
+        return slice(int(start[i]), int(start[i + 1]))
+
+    def solution(self, key: str, mtime: float) -> NetworkState | None:
+        """Precomputed zero-cost solution of `key`, if one was built from
+        the source file with this mtime."""
+        key = f"solution:{key}"
+        return self.network(key) if self.is_fresh(key, mtime) else None
+
+    def network(self, key: str) -> NetworkState:
+        i = self.index[key]
+        nodes_at = self.nodes_slice(key)
+        lines_at = self.lines_slice(key)
+
+        node_ids = [nid.decode() for nid in self["node_id"][nodes_at]]
+        nodes = {
+            node_id: Node(
+                id=node_id,
+                injection=float(injection),
+                x=float(x),
+                y=float(y),
+                cost_increase=int(cost_increase),
+                cost_decrease=int(cost_decrease),
+            )
+            for node_id, injection, x, y, cost_increase, cost_decrease in zip(
+                node_ids,
+                self["injection"][nodes_at].tolist(),
+                self["x"][nodes_at].tolist(),
+                self["y"][nodes_at].tolist(),
+                self["cost_increase"][nodes_at].tolist(),
+                self["cost_decrease"][nodes_at].tolist(),
+            )
+        }
+        lines = {}
+        for line_id, i_from, i_to, bus_from, bus_to, index, limit, flow in zip(
+            self["line_id"][lines_at],
+            self["line_from"][lines_at].tolist(),
+            self["line_to"][lines_at].tolist(),
+            self["line_from_bus"][lines_at].tolist(),
+            self["line_to_bus"][lines_at].tolist(),
+            self["line_index"][lines_at].tolist(),
+            self["limit"][lines_at].tolist(),
+            self["flow"][lines_at].tolist(),
+        ):
+            line_id = line_id.decode()
+            lines[line_id] = Line(
+                id=line_id,
+                from_node=node_ids[i_from],
+                to_node=node_ids[i_to],
+                flow=flow,
+                limit=limit,
+                from_bus=node_ids[bus_from],
+                to_bus=node_ids[bus_to],
+                index=index,
+            )
+
+        tutorial_start = self["tutorial_start"]
+        tutorial = bytes(
+            self["tutorial"][int(tutorial_start[i]): int(tutorial_start[i + 1])]
+        ).decode("utf-8")
+        level = int(self["level"][i])
+        difficulty = self["difficulty"][i].decode()
+        return NetworkState(
+            nodes=nodes,
+            lines=lines,
+            cost=float(self["cost"][i]),
+            level=level if level >= 0 else None,
+            tutorial_info=tutorial or None,
+            difficulty=difficulty or None,
+        )
+
+
+def open_bundle(path: Path = BUNDLE_PATH) -> NetworkBundle | None:
+    """Map the compiled bundle, or return None if it hasn't been built."""
+    if not path.exists():
+        return None
+    try:
+        return NetworkBundle(path)
+    except (ValueError, KeyError):
+        logger.warning("Ignoring unreadable network bundle at %s", path)
+        return None
+
+
+# (bundle file mtime, mapped bundle) — remapped when the file is rebuilt.
+_bundle: tuple[float, NetworkBundle | None] | None = None
+
+
+def get_bundle() -> NetworkBundle | None:
+    """Process-wide mapping of BUNDLE_PATH, or None if it hasn't been built."""
+    global _bundle
+    try:
+        mtime = BUNDLE_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if _bundle is None or _bundle[0] != mtime:
+        _bundle = (mtime, open_bundle())
+    return _bundle[1]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.time()
+    count = build_bundle(solutions="--solutions" in sys.argv[1:])
+    print(f"Compiled {count} networks into {BUNDLE_PATH} in {time.time() - start:.2f}s")
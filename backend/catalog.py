@@ -0,0 +1,188 @@
+"""
+Catalog of the generated networks in generated_networks/.
+
+The metadata of every network_*.json (node and line counts, difficulty,
+content hash) is kept in memory and written to CATALOG_PATH, so a restart
+only has to hash and parse files that changed. Networks themselves are
+loaded on first fetch and then kept, so fetching by index or name is a
+list/dict lookup after that.
+
+The directory is rescanned at most every RESCAN_INTERVAL_SECONDS; only
+new or modified files (by mtime and size) are re-read.
+"""
+import json
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .schemas import NetworkState, dict_to_network_state
+from .bundle import get_bundle
+
+logger = logging.getLogger(__name__)
+
+GENERATED_DIR = Path("generated_networks")
+CATALOG_PATH = Path("build/generated_catalog.json")
+
+RESCAN_INTERVAL_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    name: str  # file stem, e.g. network_001_n12
+    mtime: float
+    size: int
+    nodes: int  # base nodes, not counting split-off "b" nodes
+    lines: int
+    difficulty: str | None
+    hash: str
+
+    def public(self, index: int) -> dict:
+        return {
+            "index": index,
+            "name": self.name,
+            "nodes": self.nodes,
+            "lines": self.lines,
+            "difficulty": self.difficulty,
+            "hash": self.hash,
+        }
+
+
+class _Snapshot:
+    """State swapped in whole on every rescan. Only `networks` changes
+    afterwards, as networks are loaded on first fetch."""
+
+    def __init__(self, entries: list[CatalogEntry], networks: dict[str, NetworkState]):
+        self.entries = entries
+        self.networks = networks
+        self.index = {entry.name: i for i, entry in enumerate(entries)}
+
+
+_snapshot = _Snapshot([], {})
+_scanned_at: float | None = None
+_lock = threading.Lock()
+
+
+def _read_saved_entries() -> dict[str, CatalogEntry]:
+    try:
+        with open(CATALOG_PATH) as f:
+            return {e["name"]: CatalogEntry(**e) for e in json.load(f)}
+    except (FileNotFoundError, ValueError, TypeError, KeyError):
+        return {}
+
+
+def _save_entries(entries: list[CatalogEntry]):
+    CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CATALOG_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump([asdict(e) for e in entries], f, indent=1)
+    tmp_path.replace(CATALOG_PATH)
+
+
+def _load_network(path: Path, mtime: float) -> NetworkState:
+    bundle = get_bundle()
+    key = f"generated:{path.stem}"
+    if bundle is not None and bundle.is_fresh(key, mtime):
+        return bundle.network(key)
+    with open(path) as f:
+        return dict_to_network_state(json.load(f))
+
+
+def _entry(path: Path, mtime: float, size: int, network: NetworkState) -> CatalogEntry:
+    return CatalogEntry(
+        name=path.stem,
+        mtime=mtime,
+        size=size,
+        nodes=len(network.bus_ids()),
+        lines=len(network.lines),
+        difficulty=network.difficulty,
+        hash=hashlib.sha256(path.read_bytes()).hexdigest()[:32],
+    )
+
+
+def rescan():
+    """Bring the catalog up to date with generated_networks/."""
+    global _snapshot, _scanned_at
+    with _lock:
+        old = _snapshot
+        saved = None
+        entries, networks = [], {}
+        for path in sorted(GENERATED_DIR.glob("network_*.json")):
+            stat = path.stat()
+            name = path.stem
+            i = old.index.get(name)
+            if i is not None and (old.entries[i].mtime, old.entries[i].size) == (stat.st_mtime, stat.st_size):
+                entries.append(old.entries[i])
+                if name in old.networks:
+                    networks[name] = old.networks[name]
+                continue
+            if saved is None:
+                saved = _read_saved_entries()
+            entry = saved.get(name)
+            if entry is None or (entry.mtime, entry.size) != (stat.st_mtime, stat.st_size):
+                network = _load_network(path, stat.st_mtime)
+                entry = _entry(path, stat.st_mtime, stat.st_size, network)
+                networks[name] = network
+            entries.append(entry)
+        changed = [e.name for e in entries] != [e.name for e in old.entries] or any(
+            a is not b for a, b in zip(entries, old.entries)
+        )
+        if changed:
+            _snapshot = _Snapshot(entries, networks)
+            try:
+                _save_entries(entries)
+            except OSError:
+                logger.warning("Could not write generated network catalog to %s", CATALOG_PATH)
+        _scanned_at = time.monotonic()
+
+
+def is_stale() -> bool:
+    """True if the directory is due for a rescan."""
+    return _scanned_at is None or time.monotonic() - _scanned_at >= RESCAN_INTERVAL_SECONDS
+
+
+def _current() -> _Snapshot:
+    if is_stale():
+        rescan()
+    return _snapshot
+
+
+def count() -> int:
+    return len(_current().entries)
+
+
+def get(index: int) -> tuple[CatalogEntry, NetworkState]:
+    """Entry and network at `index`, wrapping around. The network is shared
+    and must be treated as read-only. Raises IndexError if the catalog is
+    empty."""
+    snapshot = _current()
+    if not snapshot.entries:
+        raise IndexError("No generated networks available")
+    entry = snapshot.entries[index % len(snapshot.entries)]
+    network = snapshot.networks.get(entry.name)
+    if network is None:
+        # Two threads may both load it; either copy is fine.
+        network = _load_network(GENERATED_DIR / f"{entry.name}.json", entry.mtime)
+        snapshot.networks[entry.name] = network
+    return entry, network
+
+
+def search(
+    difficulty: str | None = None,
+    min_nodes: int | None = None,
+    max_nodes: int | None = None,
+    min_lines: int | None = None,
+    max_lines: int | None = None,
+) -> list[dict]:
+    """Metadata (with index) of every network matching all given filters."""
+    return [
+        entry.public(i)
+        for i, entry in enumerate(_current().entries)
+        if (difficulty is None or entry.difficulty == difficulty)
+        and (min_nodes is None or entry.nodes >= min_nodes)
+        and (max_nodes is None or entry.nodes <= max_nodes)
+        and (min_lines is None or entry.lines >= min_lines)
+        and (max_lines is None or entry.lines <= max_lines)
+    ]
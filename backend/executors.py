@@ -0,0 +1,137 @@
+"""
+Process pool for CPU-bound work: the auto-solver and network generation.
+
+These run for up to seconds of pure Python/NumPy. In a separate process
+they can't hold the GIL of the worker serving everything else, so quick
+routes like /api/me keep their latency while solves are running.
+
+Admission control: at most CPU_WORKERS jobs run and CPU_QUEUE_LIMIT more
+may wait; run_cpu() raises PoolSaturated beyond that, which the API turns
+into a 503, so a burst of solves can't queue up unbounded work.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CPU_WORKERS = int(os.environ.get("CONGEST_CPU_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+CPU_QUEUE_LIMIT = int(os.environ.get("CONGEST_CPU_QUEUE_LIMIT", 8))
+
+_pool: ProcessPoolExecutor | None = None
+_pending = 0
+_lock = threading.Lock()
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: the server process has threads (DB pool,
+        # bcrypt pool), which fork would copy in whatever state they're in.
+        _pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _discard_broken_pool():
+    # A worker died (e.g. OOM-killed), which breaks the whole pool; the
+    # next job starts a fresh one.
+    global _pool
+    logger.warning("CPU process pool broken, restarting it")
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_with_metrics(fn, *args):
+    # Runs in a pool process, one job at a time: whatever the metrics
+    # gained meanwhile was counted by this job.
+    before = metrics.snapshot()
+    result = fn(*args)
+    return result, metrics.changes_since(before)
+
+
+def _submit(fn, *args):
+    with _lock:
+        pool = _get_pool()
+    try:
+        return pool.submit(_run_with_metrics, fn, *args)
+    except BrokenProcessPool:
+        _discard_broken_pool()
+        with _lock:
+            pool = _get_pool()
+        return pool.submit(_run_with_metrics, fn, *args)
+
+
+def _unwrap(outcome):
+    result, delta = outcome
+    metrics.merge(delta)
+    return result
+
+
+async def run_cpu(fn, *args):
+    """Run `fn(*args)` in the process pool. Arguments and result must be
+    picklable and `fn` importable at module level. Raises PoolSaturated if
+    the pool and its queue are full."""
+    global _pending
+    with _lock:
+        if _pending >= CPU_WORKERS + CPU_QUEUE_LIMIT:
+            raise PoolSaturated()
+        _pending += 1
+    try:
+        return _unwrap(await asyncio.wrap_future(_submit(fn, *args)))
+    except BrokenProcessPool:
+        _discard_broken_pool()
+        raise
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def run_cpu_blocking(fn, *args):
+    """run_cpu for sync callers (threadpool routes). Never rejected: only
+    for work the request can't do without, like generating the daily."""
+    global _pending
+    with _lock:
+        _pending += 1
+    try:
+        return _unwrap(_submit(fn, *args).result())
+    except BrokenProcessPool:
+        _discard_broken_pool()
+        raise
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _load_solver():
+    # Runs in a pool process: pays for the imports there, not in a request.
+    from . import network  # noqa: F401
+    from scipy.spatial import Delaunay  # noqa: F401
+
+
+def warm_up():
+    """Start every pool process and import the solver in it."""
+    futures = [_submit(_load_solver) for _ in range(CPU_WORKERS)]
+    for future in futures:
+        _unwrap(future.result())
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+"""
+Cached ranking for /api/leaderboard.
+
+Players are ranked by daily streak, then money, then id (newest first), which
+is exactly the order of the ix_players_ranking index. The top
+SNAPSHOT_SIZE rows are kept in memory for SNAPSHOT_TTL_SECONDS. Writes
+that change a player's ranking columns update that player's row in the
+snapshot in place instead of dropping the whole snapshot.
+"""
+import bisect
+import threading
+import time
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+
+from .models import Player
+
+SNAPSHOT_SIZE = 1000
+SNAPSHOT_TTL_SECONDS = 30
+
+
+def _rank_key(player: Player):
+    return (-(player.daily_streak or 0), -player.money, -player.id)
+
+
+def _ranking_query(db: Session):
+    return db.query(Player).options(selectinload(Player.progress)).order_by(
+        Player.daily_streak.desc(), Player.money.desc(), Player.id.desc()
+    )
+
+
+class LeaderboardCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: list[tuple] = []
+        self._rows: list[dict] = []
+        # username -> its dict in _rows
+        self._by_username: dict[str, dict] = {}
+        # True if _rows holds every player, not just the top SNAPSHOT_SIZE.
+        self._complete = False
+        self._built_at: float | None = None
+
+    def _fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < SNAPSHOT_TTL_SECONDS
+
+    def _rebuild(self, db: Session):
+        players = _ranking_query(db).limit(SNAPSHOT_SIZE).all()
+        self._keys = [_rank_key(p) for p in players]
+        self._rows = [p.package_data() for p in players]
+        self._by_username = {row["username"]: row for row in self._rows}
+        self._complete = len(players) < SNAPSHOT_SIZE
+        self._built_at = time.monotonic()
+
+    def page(self, db: Session, limit: int, offset: int) -> list[dict]:
+        with self._lock:
+            if not self._fresh():
+                self._rebuild(db)
+            if offset + limit <= len(self._rows) or self._complete:
+                return self._rows[offset: offset + limit]
+        # Beyond the cached window: served straight from the index.
+        return [p.package_data() for p in _ranking_query(db).offset(offset).limit(limit)]
+
+    def _remove_locked(self, username: str) -> bool:
+        if self._by_username.pop(username, None) is None:
+            return False
+        for i, row in enumerate(self._rows):
+            if row["username"] == username:
+                del self._keys[i]
+                del self._rows[i]
+                return True
+        return False
+
+    def update(self, player: Player):
+        """Re-rank one player after a write to their ranking columns."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            was_cached = self._remove_locked(player.username)
+            key = _rank_key(player)
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) or self._complete:
+                row = player.package_data()
+                self._keys.insert(i, key)
+                self._rows.insert(i, row)
+                self._by_username[row["username"]] = row
+                if len(self._rows) > SNAPSHOT_SIZE:
+                    self._keys.pop()
+                    del self._by_username[self._rows.pop()["username"]]
+                    self._complete = False
+            elif was_cached:
+                # The player dropped out of the cached window, so some other
+                # player we don't have moves in: rebuild on the next read.
+                self._built_at = None
+
+    def set_current_level(self, username: str, level: int):
+        """Show a new current level for a cached player: it isn't a ranking
+        column, so the row stays where it is."""
+        with self._lock:
+            row = self._by_username.get(username)
+            if row is not None:
+                row["current_level"] = level
+
+    def remove(self, player: Player):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove_locked(player.username)
+            if not self._complete:
+                self._built_at = None
+
+
+def player_rank(db: Session, player: Player) -> int:
+    """1-based position of `player` in the ranking, counted via the index."""
+    streak = player.daily_streak or 0
+    ahead = db.query(Player).filter(
+        or_(
+            Player.daily_streak > streak,
+            and_(Player.daily_streak == streak, Player.money > player.money),
+            and_(
+                Player.daily_streak == streak,
+                Player.money == player.money,
+                Player.id > player.id,
+            ),
+        )
+    ).count()
+    return ahead + 1
+
+
+leaderboard_cache = LeaderboardCache()
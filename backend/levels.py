@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+
+from .schemas import NetworkState
+from .network import read_level_file
+from .bundle import get_bundle
+
+logger = logging.getLogger(__name__)
+
+LEVELS_DIR = Path("levels")
+
+# Set CONGEST_WATCH_LEVELS=1 in development to pick up edits to levels/
+# without restarting the server.
+WATCH_LEVELS = os.environ.get("CONGEST_WATCH_LEVELS") == "1"
+
+# Seconds between mtime polls of the watcher thread.
+WATCH_INTERVAL_SECONDS = 1.0
+
+# level number -> (file mtime, reset and power-flowed NetworkState)
+_levels: dict[int, tuple[float, NetworkState]] = {}
+_lock = threading.Lock()
+_watcher: threading.Thread | None = None
+
+
+def _level_files() -> dict[int, Path]:
+    return {
+        int(path.stem[len("Level"):]): path
+        for path in LEVELS_DIR.glob("Level*.json")
+        if path.stem[len("Level"):].isdigit()
+    }
+
+
+def preload_levels():
+    """
+    Load, reset and power-flow every level once. Safe to call again: only
+    files whose mtime changed (and new or deleted files) are reloaded.
+
+    Levels are taken from the compiled bundle (see bundle.py) when it is
+    up to date with the level file, and parsed from JSON otherwise.
+    """
+    global _levels
+    files = _level_files()
+    bundle = get_bundle()
+    with _lock:
+        levels = dict(_levels)
+        for num in list(levels):
+            if num not in files:
+                del levels[num]
+        for num, path in files.items():
+            mtime = path.stat().st_mtime
+            if num in levels and levels[num][0] == mtime:
+                continue
+            key = f"level:{num}"
+            if bundle is not None and bundle.is_fresh(key, mtime):
+                network = bundle.network(key)
+            else:
+                if bundle is not None:
+                    logger.warning("Network bundle is stale for %s, reading JSON", path)
+                network = read_level_file(str(path))
+            levels[num] = (mtime, network)
+            if num in _levels:
+                logger.info("Reloaded level %d from %s", num, path)
+        # Swap in a new dict so readers never see a half-built cache.
+        _levels = levels
+    if WATCH_LEVELS:
+        _start_watcher()
+
+
+def _start_watcher():
+    global _watcher
+    if _watcher is not None:
+        return
+
+    def watch():
+        while True:
+            time.sleep(WATCH_INTERVAL_SECONDS)
+            try:
+                preload_levels()
+            except Exception:
+                logger.exception("Level watcher failed to reload levels")
+
+    _watcher = threading.Thread(target=watch, name="level-watcher", daemon=True)
+    _watcher.start()
+
+
+def level_count() -> int:
+    if not _levels:
+        preload_levels()
+    return len(_levels)
+
+
+def get_level(level: int) -> NetworkState:
+    """
+    Return the cached, power-flowed initial state of a level.
+
+    The returned object is shared between all requests and must be treated
+    as read-only; use load_level() for a private copy that can be mutated.
+    """
+    if not _levels:
+        preload_levels()
+    entry = _levels.get(level)
+    if entry is None:
+        raise ValueError(f"Level must be between 1 and {len(_levels)}")
+    return entry[1]
+
+
+def load_level(level: int) -> NetworkState:
+    """Private deep copy of a cached level, safe to switch or redispatch."""
+    return get_level(level).model_copy(deep=True)
+
+
+def get_level_solution(level: int) -> NetworkState | None:
+    """Precomputed zero-cost solution of the level's initial state, if the
+    bundle was built with --solutions from the current level file."""
+    entry = _levels.get(level)
+    bundle = get_bundle()
+    if entry is None or bundle is None:
+        return None
+    return bundle.solution(f"level:{level}", entry[0])
@@ -1,71 +1,103 @@
+from . import startup  # first, so that it sees the process start
+from contextlib import asynccontextmanager
 from copy import deepcopy
 import math
+import os
+import time
 import json
 import datetime
-from pathlib import Path
 from typing import Optional
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from .network import (
     generate_network,
     calculate_power_flow,
+    contingency_analysis,
     update_network,
     solve_network,
-    load_level,
     reset_all_switches,
     validate_network,
     get_or_create_daily_network,
+    get_daily_solution,
+    peek_daily_network,
     calculate_redispatch_cost,
     stars_for_redispatch_cost,
+    replay_moves,
 )
+from .levels import get_level, get_level_solution, preload_levels
+from .optimization import optimal_redispatch, optimal_switching_redispatch, validate_costs
+from . import catalog, executors
+from .responses import cached_payload, payload_response
+from .sessions import sessions
+from .leaderboard import leaderboard_cache, player_rank
+from .progress import award_daily_solution, award_level_solution
+from .auth_cache import profile_cache, token_cache
+from . import metrics, profiling
 from .schemas import (
     ProgressUpdateRequest,
     TopologyChangeRequest,
     LoadLevelRequest,
     NetworkStateRequest,
+    SolveRequest,
+    MoveListSolutionRequest,
     SwitchNodeRequest,
     ResetSwitchesRequest,
     dict_to_network_state,
+    bus_of,
     RegisterRequest,
     LoginRequest,
     rewardResponse,
     DailyProblemResponse,
+    NetworkState,
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import APIRouter
 
-from .database import Base, engine, SessionLocal
-from .models import Player
+from .database import SessionLocal
+from .migrations import run_migrations
+from .models import Player, PlayerLevelProgress
 from .auth import (
-    hash_password,
-    verify_password,
+    PasswordQueueFull,
+    hash_password_async,
+    needs_rehash,
+    verify_password_async,
 )
+from .throttle import ip_attempts, username_failures
 from .jwt_utils import (
     create_access_token,
     decode_access_token,
 )
 
-Base.metadata.create_all(bind=engine)
-
-# Migrate existing DB: add columns if absent
-from sqlalchemy import text as _text
-with engine.connect() as _conn:
-    for _col, _ddl in [
-        ("daily_solved_date", "ALTER TABLE players ADD COLUMN daily_solved_date VARCHAR DEFAULT NULL"),
-        ("daily_solved_count", "ALTER TABLE players ADD COLUMN daily_solved_count INTEGER DEFAULT 0"),
-        ("daily_streak",       "ALTER TABLE players ADD COLUMN daily_streak INTEGER DEFAULT 0"),
-        ("daily_stars",        "ALTER TABLE players ADD COLUMN daily_stars INTEGER DEFAULT 0"),
-        ("level_stars",        "ALTER TABLE players ADD COLUMN level_stars VARCHAR DEFAULT '{}'"),
-    ]:
-        try:
-            _conn.execute(_text(_ddl))
-            _conn.commit()
-        except Exception:
-            pass  # column already exists
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No-op unless a deploy brought new migrations (see migrations.py).
+    # Under gunicorn the master has already run them (gunicorn.conf.py).
+    if os.environ.get("CONGEST_MIGRATIONS_DONE") != "1":
+        started = time.monotonic()
+        run_migrations()
+        startup.record("migrations", started)
+    startup.record("listening", startup.PROCESS_STARTED)
+    startup.start_warmup([
+        # Parse, reset and power-flow every level once so that level
+        # requests never touch disk or NumPy.
+        ("levels", preload_levels),
+        ("generated networks", catalog.rescan),
+        # Generation imports scipy lazily; don't let a request pay for it.
+        ("scipy", lambda: __import__("scipy.spatial")),
+        ("solver pool", executors.warm_up),
+        ("daily network", _daily_network),
+    ])
+    yield
+    executors.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 router = APIRouter(prefix="/api")
 
 app.add_middleware(
@@ -74,6 +106,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if profiling.PROFILE_TOKEN is not None:
+    app.add_middleware(profiling.ProfileRequestMiddleware)
+if metrics.ENABLED:
+    app.add_middleware(metrics.RouteMetricsMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 # Same scheme, but tolerant of a missing token: endpoints that are playable
@@ -88,17 +124,51 @@ def get_db():
     finally:
         db.close()
 
-def get_current_player(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-):
+def _player_id_for_token(token: str, db: Session) -> int:
+    """Verify `token` and return its player id, from token_cache if this
+    token was verified recently."""
+    player_id = token_cache.get(token)
+    if player_id is not None:
+        return player_id
+
     payload = decode_access_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    username = payload["sub"]
-    player = db.query(Player).filter(Player.username == username).first()
+    player_id = db.query(Player.id).filter(Player.username == payload["sub"]).scalar()
+    if player_id is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    token_cache.put(token, player_id, expires_at=payload.get("exp"))
+    return player_id
+
+
+def _verify_token(token: str) -> int:
+    db = SessionLocal()
+    try:
+        return _player_id_for_token(token, db)
+    finally:
+        db.close()
+
+
+async def get_current_player_id(token: str = Depends(oauth2_scheme)) -> int:
+    """For routes that only need to know who is calling: no Player load,
+    and on a token cache hit no query and no threadpool hop."""
+    player_id = token_cache.get(token)
+    if player_id is None:
+        player_id = await run_in_threadpool(_verify_token, token)
+    return player_id
+
+
+def get_current_player(
+    player_id: int = Depends(get_current_player_id),
+    db: Session = Depends(get_db),
+):
+    # db.get goes through the session's identity map, so later lookups of
+    # the same player in this request don't query again.
+    player = db.get(Player, player_id)
     if not player:
+        token_cache.pop_value(player_id)
         raise HTTPException(status_code=401, detail="User not found")
 
     return player
@@ -113,84 +183,247 @@ def get_optional_player(
     guest is allowed to see."""
     if not token:
         return None
-    payload = decode_access_token(token)
-    if not payload or "sub" not in payload:
+    try:
+        player_id = _player_id_for_token(token, db)
+    except HTTPException:
         return None
-    return db.query(Player).filter(Player.username == payload["sub"]).first()
+    return db.get(Player, player_id)
+
+
+def _player_changed(player: Player):
+    """Call after committing a write to `player`."""
+    profile_cache.pop(player.id)
+    leaderboard_cache.update(player)
+
+
+def _client_ip(request: Request) -> str:
+    # uvicorn rewrites the client from X-Forwarded-For for the local proxy.
+    return request.client.host if request.client else "unknown"
+
+
+def _check_throttle(*keys: tuple):
+    """Raise 429 if any (limiter, key) pair is throttled."""
+    for limiter, key in keys:
+        retry_after = limiter.retry_after(key)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+async def _password_work(coro):
+    try:
+        return await coro
+    except PasswordQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+# Login and registration are async so that waiting on bcrypt holds no
+# thread; only the short DB calls go to the threadpool.
+
+def _create_player(db: Session, username: str, password_hash: str) -> Optional[Player]:
+    if db.query(Player).filter(Player.username == username).first():
+        return None
+    player = Player(username=username, password_hash=password_hash)
+    db.add(player)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    db.refresh(player)
+    _player_changed(player)
+    return player
 
 
 @router.post("/register")
-def register(data: RegisterRequest, db: Session = Depends(get_db)):
-    existing = db.query(Player).filter(Player.username == data.username).first()
+async def register(data: RegisterRequest, request: Request, db: Session = Depends(get_db)):
+    ip = _client_ip(request)
+    _check_throttle((ip_attempts, ip))
+    ip_attempts.record(ip)
+
+    existing = await run_in_threadpool(
+        lambda: db.query(Player.id).filter(Player.username == data.username).first()
+    )
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    player = Player(
-        username=data.username,
-        password_hash=hash_password(data.password),
-    )
-    db.add(player)
-    db.commit()
-    db.refresh(player)
+    password_hash = await _password_work(hash_password_async(data.password))
+    # Re-checked on insert: the name may have been taken while hashing.
+    player = await run_in_threadpool(_create_player, db, data.username, password_hash)
+    if player is None:
+        raise HTTPException(status_code=400, detail="Username already exists")
 
     token = create_access_token({"sub": player.username})
 
     return {
         "access_token": token,
         "token_type": "bearer",
-        "player": player.package_data()
+        "player": await run_in_threadpool(player.package_data),
     }
 
+
+def _rehash_password(db: Session, player: Player, password_hash: str):
+    player.password_hash = password_hash
+    db.commit()
+
+
 @router.post("/login")
-def login(data: LoginRequest, db: Session = Depends(get_db)):
-    player = db.query(Player).filter(Player.username == data.username).first()
-    if not player or not verify_password(data.password, player.password_hash):
+async def login(data: LoginRequest, request: Request, db: Session = Depends(get_db)):
+    ip = _client_ip(request)
+    _check_throttle((username_failures, data.username), (ip_attempts, ip))
+
+    player = await run_in_threadpool(
+        lambda: db.query(Player).filter(Player.username == data.username).first()
+    )
+    if not player or not await _password_work(
+        verify_password_async(data.password, player.password_hash)
+    ):
+        username_failures.record(data.username)
+        ip_attempts.record(ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    username_failures.clear(data.username)
+
+    if needs_rehash(player.password_hash):
+        # The work factor changed since this hash was made; upgrade it now
+        # that we have the plain password.
+        try:
+            new_hash = await hash_password_async(data.password)
+        except PasswordQueueFull:
+            pass  # try again on the next login
+        else:
+            await run_in_threadpool(_rehash_password, db, player, new_hash)
 
     token = create_access_token({"sub": player.username})
 
     return {
         "access_token": token,
         "token_type": "bearer",
-        "player": player.package_data()
+        "player": await run_in_threadpool(player.package_data),
     }
 
 
+# The remaining player routes are async too, with their DB work (and the
+# power flow of a submission) in the threadpool and solver work in the
+# process pool, so that none of them holds a threadpool thread while
+# waiting on anything else.
+
+def _save_progress(data: ProgressUpdateRequest, player: Player, db: Session):
+    player.current_level = data.current_level
+    player.unlocked_levels = data.unlocked_levels
+
+    db.commit()
+    _player_changed(player)
+
+
 @router.post("/save_progress")
-def save_progress(
+async def save_progress(
     data: ProgressUpdateRequest,
     player: Player = Depends(get_current_player),
     db: Session = Depends(get_db),
 ):
-    player.current_level = data.current_level
-    player.unlocked_levels = data.unlocked_levels
-
-    db.commit()
+    await run_in_threadpool(_save_progress, data, player, db)
     return {"status": "ok"}
 
+def _load_profile(player_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        data = get_current_player(player_id, db).package_data()
+    finally:
+        db.close()
+    profile_cache.put(player_id, data)
+    return data
+
+
 @router.get("/me")
-def get_me(player: Player = Depends(get_current_player)):
-    return player.package_data()
+async def get_me(player_id: int = Depends(get_current_player_id)):
+    data = profile_cache.get(player_id)
+    if data is None:
+        data = await run_in_threadpool(_load_profile, player_id)
+    return data
+
+def _delete_account(player: Player, db: Session):
+    # App Store 5.1.1(v): account-creating apps must let users delete their
+    # account from within the app. Deleting the Player row cascades to its
+    # level progress, which fully erases the account.
+    leaderboard_cache.remove(player)
+    player_id = player.id
+    db.delete(player)
+    db.commit()
+    token_cache.pop_value(player_id)
+    profile_cache.pop(player_id)
+
 
 @router.delete("/delete_account")
-def delete_account(
+async def delete_account(
     player: Player = Depends(get_current_player),
     db: Session = Depends(get_db),
 ):
-    # App Store 5.1.1(v): account-creating apps must let users delete their
-    # account from within the app. The Player row is self-contained (no
-    # related tables), so a single delete fully erases the account.
-    db.delete(player)
-    db.commit()
+    await run_in_threadpool(_delete_account, player, db)
     return {"status": "ok"}
 
 @router.get("/leaderboard")
-def leaderboard(player: Player = Depends(get_current_player), db: Session = Depends(get_db)):
-    players = db.query(Player).order_by(Player.daily_streak.desc(), Player.money.desc()).all()
-    return [p.package_data() for p in players]
+async def leaderboard(
+    limit: int = Query(default=100, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    player_id: int = Depends(get_current_player_id),
+    db: Session = Depends(get_db),
+):
+    return await run_in_threadpool(leaderboard_cache.page, db, limit, offset)
+
+
+@router.get("/level_stats/{level}")
+async def level_stats(level: int, player_id: int = Depends(get_current_player_id), db: Session = Depends(get_db)):
+    """How many players solved a level, and with how many stars."""
+    rows = await run_in_threadpool(
+        lambda: db.query(PlayerLevelProgress.stars, func.count())
+        .filter(PlayerLevelProgress.level == level)
+        .group_by(PlayerLevelProgress.stars)
+        .all()
+    )
+    by_stars = {stars: count for stars, count in rows}
+    return {"level": level, "solved": sum(by_stars.values()), "stars": by_stars}
+
+
+@router.get("/leaderboard/me")
+async def leaderboard_me(player: Player = Depends(get_current_player), db: Session = Depends(get_db)):
+    return await run_in_threadpool(
+        lambda: {"rank": player_rank(db, player), "player": player.package_data()}
+    )
+
+def _matches_original(network: NetworkState, original: NetworkState) -> bool:
+    """True if `network` is `original` with only switch moves and redispatch
+    applied (same base nodes, injections and lines)."""
+    submitted = deepcopy(network)
+    # Each line's buses and index come from the level, never from the
+    # client: a submitted line is the level line between the buses its
+    # ends are on, and each level line may appear once.
+    by_buses = {(line.from_bus, line.to_bus): line for line in original.lines.values()}
+    seen = set()
+    for line in submitted.lines.values():
+        level_line = by_buses.get((bus_of(line.from_node, original.nodes), bus_of(line.to_node, original.nodes)))
+        if level_line is None or level_line.index in seen:
+            return False
+        seen.add(level_line.index)
+        line.from_bus, line.to_bus, line.index = level_line.from_bus, level_line.to_bus, level_line.index
+    submitted_reset = reset_all_switches(submitted)
+    adjustments = network.redispatch.get("adjustments", {})
+    original_nodes = {nid: (n.injection, n.x, n.y) for nid, n in original.nodes.items()}
+    submitted_nodes = {
+        nid: (n.injection - adjustments.get(nid, 0), n.x, n.y)
+        for nid, n in submitted_reset.nodes.items()
+    }
+    return original_nodes == submitted_nodes and set(original.lines) == set(submitted_reset.lines)
+
 
 @router.post("/check_solution", response_model=rewardResponse)
-def check_solution(
+async def check_solution(
     data: NetworkStateRequest,
     player: Player = Depends(get_current_player),
     db: Session = Depends(get_db),
@@ -200,6 +433,10 @@ def check_solution(
     Validates that the submitted topology is a legal derivative of the original level
     (same base nodes and injections, only switch moves applied).
     """
+    return await run_in_threadpool(_check_level_solution, data, player, db)
+
+
+def _check_level_solution(data: NetworkStateRequest, player: Player, db: Session):
     network = dict_to_network_state(data.network_data)
 
     try:
@@ -211,42 +448,63 @@ def check_solution(
         raise HTTPException(status_code=400, detail="Network has no level set")
 
     # Verify the topology is a legal derivative of the original level
-    original = load_level(network.level)
-    submitted_reset = reset_all_switches(deepcopy(network))
-    adjustments = network.redispatch.get("adjustments", {})
-    original_nodes = {nid: (n.injection, n.x, n.y) for nid, n in original.nodes.items()}
-    submitted_nodes = {
-        nid: (n.injection - adjustments.get(nid, 0), n.x, n.y)
-        for nid, n in submitted_reset.nodes.items()
-    }
-    original_lines = set(original.lines.keys())
-    submitted_lines = set(submitted_reset.lines.keys())
-    if original_nodes != submitted_nodes or original_lines != submitted_lines:
+    try:
+        original = get_level(network.level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not _matches_original(network, original):
         raise HTTPException(status_code=400, detail="Submitted network does not match original level")
 
+    return _reward_level_solution(network, player, db)
+
+
+@router.post("/check_solution_moves", response_model=rewardResponse)
+async def check_solution_moves(
+    data: MoveListSolutionRequest,
+    player: Player = Depends(get_current_player),
+    db: Session = Depends(get_db),
+):
+    """
+    Same as /check_solution, but the client only sends the level and its
+    ordered switch moves and redispatch adjustments, which are replayed on
+    the cached original level.
+    """
+    return await run_in_threadpool(_check_level_moves, data, player, db)
+
+
+def _check_level_moves(data: MoveListSolutionRequest, player: Player, db: Session):
+    if data.level is None:
+        raise HTTPException(status_code=400, detail="No level given")
+    try:
+        original = get_level(data.level)
+        network = replay_moves(original, data.moves, data.adjustments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _reward_level_solution(network, player, db)
+
+
+def _reward_level_solution(network: NetworkState, player: Player, db: Session):
+    """Power-flow a verified level submission and reward the player if solved."""
+    level = network.level
+    assert level is not None
     network = calculate_power_flow(network)
 
-    all_lines_within_capacity = all(
-        abs(line.flow) <= line.limit for line in network.lines.values()
-    )
+    # Zero cost: every line within capacity and the network in one piece
+    # (a split topology carries an island penalty).
+    all_lines_within_capacity = network.cost == 0.0
 
     redispatch_cost = calculate_redispatch_cost(network)
 
     reward = 0
     stars = None
-    # If the player completed a new level, unlock the next level
+    # If the player completed a new level, unlock the next level. All
+    # validation is done by now, so the write transaction stays short.
     if all_lines_within_capacity:
-        if player.unlocked_levels == player.current_level:
-            player.unlocked_levels += 1
-            reward = 50  # Reward for completing the level
-        player.money += reward - redispatch_cost
-
-        level_stars = player.get_level_stars()
-        stars = max(level_stars.get(network.level, 0), stars_for_redispatch_cost(redispatch_cost))
-        level_stars[network.level] = stars
-        player.set_level_stars(level_stars)
-
+        reward, stars = award_level_solution(
+            db, player.id, level, stars_for_redispatch_cost(redispatch_cost), redispatch_cost
+        )
         db.commit()
+        _player_changed(player)
 
     return rewardResponse(
         solved=all_lines_within_capacity,
@@ -257,20 +515,110 @@ def check_solution(
     )
 
 
+def _precomputed_solution(network: NetworkState) -> Optional[NetworkState]:
+    """The bundle's stored solution for the level or daily `network` was
+    derived from, if it has one and `network` has no redispatch (which
+    the stored solution wouldn't include)."""
+    if network.redispatch.get("adjustments"):
+        return None
+    if network.level is not None:
+        try:
+            original = get_level(network.level)
+        except ValueError:
+            return None
+        solution = get_level_solution(network.level)
+    else:
+        original = peek_daily_network()
+        solution = get_daily_solution()
+    if solution is None or original is None or not _matches_original(network, original):
+        return None
+    return solution
+
+
+# Players with a solve in the process pool; one at a time each.
+_players_solving: set[int] = set()
+
+# N-1 screening builds a lines x lines outage matrix; the largest level
+# has 41 lines.
+MAX_CONTINGENCY_LINES = int(os.environ.get("CONGEST_MAX_CONTINGENCY_LINES", 300))
+
+
+async def _run_for_player(player_id: int, request: Request, fn, network: NetworkState):
+    """Run `fn(network)` in the process pool on behalf of a player: 429 if
+    they already have a job there, 503 if the pool is saturated."""
+    if player_id in _players_solving:
+        raise HTTPException(status_code=429, detail="A solve is already running for this player")
+    _players_solving.add(player_id)
+    try:
+        return await executors.run_cpu(
+            *profiling.wrap(fn, network, force=profiling.requested(request.headers))
+        )
+    except executors.PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Solver busy, try again shortly",
+            headers={"Retry-After": "2"},
+        )
+    finally:
+        _players_solving.discard(player_id)
+
+# /api/solve modes: solver, and the error when it returns None.
+SOLVE_MODES = {
+    "switching": (solve_network, None),
+    "redispatch": (optimal_redispatch, "No redispatch found; is the network split into islands?"),
+    "joint": (optimal_switching_redispatch, "No solution found within the time limit"),
+}
+
+
 @router.post("/solve")
-def solve_net(
-    data: NetworkStateRequest,
-    player: Player = Depends(get_current_player),
+async def solve_net(
+    data: SolveRequest,
+    request: Request,
+    player_id: int = Depends(get_current_player_id),
 ):
+    if data.mode not in SOLVE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown solve mode '{data.mode}'")
+    solver, no_solution = SOLVE_MODES[data.mode]
     network = dict_to_network_state(data.network_data)
     try:
         validate_network(network)
+        if data.mode != "switching":
+            validate_costs(network)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    network = solve_network(network)
+
+    if data.mode == "switching":
+        solution = _precomputed_solution(network)
+        if solution is not None:
+            return solution
+
+    network = await _run_for_player(player_id, request, solver, network)
+    if network is None:
+        raise HTTPException(status_code=422, detail=no_solution)
     return network
 
 
+@router.post("/contingencies")
+async def contingencies(
+    data: NetworkStateRequest,
+    request: Request,
+    player_id: int = Depends(get_current_player_id),
+):
+    """N-1 screening of the posted network: which single line outages
+    would overload it (see network.contingency_analysis)."""
+    network = dict_to_network_state(data.network_data)
+    if len(network.lines) > MAX_CONTINGENCY_LINES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Contingency screening is limited to {MAX_CONTINGENCY_LINES} lines",
+        )
+    try:
+        validate_network(network)
+        return await _run_for_player(player_id, request, contingency_analysis, network)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # @router.post("/save_network")
 # def save_network(network: dict):
 #     os.makedirs("saves", exist_ok=True)
@@ -288,9 +636,21 @@ def solve_net(
 #     return network
 
 
+def _set_current_level(player: Player, db: Session, level_num: int):
+    # Neither score nor money changes, so the player keeps their
+    # leaderboard position; the values are read before the commit
+    # expires the row.
+    player_id, username = player.id, player.username
+    player.current_level = level_num
+    db.commit()
+    profile_cache.pop(player_id)
+    leaderboard_cache.set_current_level(username, level_num)
+
+
 @router.post("/load_level")
-def load_level_endpoint(
+async def load_level_endpoint(
     data: LoadLevelRequest,
+    request: Request,
     player: Player = Depends(get_current_player),
     db: Session = Depends(get_db),
 ):
@@ -300,40 +660,63 @@ def load_level_endpoint(
             detail="Level not unlocked",
         )
 
-    # Load the level
-    network = load_level(data.level_num)
+    try:
+        network = get_level(data.level_num)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    # Update current level if progressing
-    player.current_level = data.level_num
-    db.commit()
+    await run_in_threadpool(_set_current_level, player, db, data.level_num)
 
-    return network
+    payload = cached_payload(("level", data.level_num), network, network.model_dump)
+    return payload_response(request, payload)
 
 
-def _generated_network_files():
-    return sorted(Path("generated_networks").glob("network_*.json"))
+def _daily_network() -> NetworkState:
+    # Generating a new daily takes seconds of CPU, done in the process pool.
+    return get_or_create_daily_network(
+        generate=lambda: executors.run_cpu_blocking(*profiling.wrap(generate_network))
+    )
+
+
+async def _daily_network_async() -> NetworkState:
+    # Past the first request of the day the daily is in memory; only
+    # loading or generating it needs a thread.
+    network = peek_daily_network()
+    if network is None:
+        network = await run_in_threadpool(_daily_network)
+    return network
 
 
 @router.get("/daily_problem", response_model=DailyProblemResponse)
-def daily_problem(player: Optional[Player] = Depends(get_optional_player)):
+async def daily_problem(
+    request: Request,
+    player: Optional[Player] = Depends(get_optional_player),
+):
     # Playable without an account (App Store 5.1.1(v)): the puzzle itself is
     # a non-account feature. A guest simply never has `already_solved` set —
     # streaks and the leaderboard remain account-only.
-    network = get_or_create_daily_network()
+    network = await _daily_network_async()
     today = datetime.date.today().isoformat()
     already_solved = player is not None and player.daily_solved_date == today
-    return DailyProblemResponse(
-        network=network.model_dump(),
-        already_solved=already_solved,
+    payload = cached_payload(
+        ("daily", already_solved),
+        network,
+        lambda: {"network": network.model_dump(), "already_solved": already_solved},
     )
+    return payload_response(request, payload)
 
 
 @router.post("/check_daily_solution", response_model=rewardResponse)
-def check_daily_solution(
+async def check_daily_solution(
     data: NetworkStateRequest,
     player: Player = Depends(get_current_player),
     db: Session = Depends(get_db),
 ):
+    original = await _daily_network_async()
+    return await run_in_threadpool(_check_daily_solution, data, original, player, db)
+
+
+def _check_daily_solution(data: NetworkStateRequest, original: NetworkState, player: Player, db: Session):
     network = dict_to_network_state(data.network_data)
 
     try:
@@ -342,19 +725,35 @@ def check_daily_solution(
         raise HTTPException(status_code=400, detail=str(e))
 
     # Validate topology against today's daily network
-    original = get_or_create_daily_network()
-    submitted_reset = reset_all_switches(deepcopy(network))
-    adjustments = network.redispatch.get("adjustments", {})
-    original_nodes = {nid: (n.injection, n.x, n.y) for nid, n in original.nodes.items()}
-    submitted_nodes = {
-        nid: (n.injection - adjustments.get(nid, 0), n.x, n.y)
-        for nid, n in submitted_reset.nodes.items()
-    }
-    if original_nodes != submitted_nodes or set(original.lines.keys()) != set(submitted_reset.lines.keys()):
+    if not _matches_original(network, original):
         raise HTTPException(status_code=400, detail="Submitted network does not match today's daily problem")
 
+    return _reward_daily_solution(network, player, db)
+
+
+@router.post("/check_daily_solution_moves", response_model=rewardResponse)
+async def check_daily_solution_moves(
+    data: MoveListSolutionRequest,
+    player: Player = Depends(get_current_player),
+    db: Session = Depends(get_db),
+):
+    """Move-list variant of /check_daily_solution (see /check_solution_moves)."""
+    original = await _daily_network_async()
+    return await run_in_threadpool(_check_daily_moves, data, original, player, db)
+
+
+def _check_daily_moves(data: MoveListSolutionRequest, original: NetworkState, player: Player, db: Session):
+    try:
+        network = replay_moves(original, data.moves, data.adjustments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _reward_daily_solution(network, player, db)
+
+
+def _reward_daily_solution(network: NetworkState, player: Player, db: Session):
+    """Power-flow a verified daily submission and reward the player if solved."""
     network = calculate_power_flow(network)
-    all_lines_ok = all(abs(line.flow) <= line.limit for line in network.lines.values())
+    all_lines_ok = network.cost == 0.0
 
     today = datetime.date.today().isoformat()
     reward = 0
@@ -362,22 +761,13 @@ def check_daily_solution(
     stars = None
     if all_lines_ok:
         redispatch_cost = calculate_redispatch_cost(network)
-        prev_stars = player.daily_stars or 0 if player.daily_solved_date == today else 0
-        stars = max(prev_stars, stars_for_redispatch_cost(redispatch_cost))
-        player.daily_stars = stars
-
-        if player.daily_solved_date != today:
-            yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
-            if player.daily_solved_date == yesterday:
-                player.daily_streak = (player.daily_streak or 0) + 1
-            else:
-                player.daily_streak = 1
-            player.daily_solved_date = today
-            player.daily_solved_count = (player.daily_solved_count or 0) + 1
-            reward = 50
-            player.money += reward
-
+        yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        reward = award_daily_solution(
+            db, player.id, today, yesterday, stars_for_redispatch_cost(redispatch_cost)
+        )
         db.commit()
+        stars = player.daily_stars
+        _player_changed(player)
 
     return rewardResponse(
         solved=all_lines_ok,
@@ -388,19 +778,130 @@ def check_daily_solution(
     )
 
 
+def _websocket_player_id(token: str) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        return _player_id_for_token(token, db)
+    except HTTPException:
+        return None
+    finally:
+        db.close()
+
+
+def _handle_play_message(player_id: int, message: dict) -> dict:
+    kind = message.get("type")
+    if kind == "start":
+        if message.get("daily"):
+            network = _daily_network()
+        else:
+            level = message.get("level")
+            if not isinstance(level, int):
+                raise ValueError("No level given")
+            db = SessionLocal()
+            try:
+                player = db.get(Player, player_id)
+                if player is None or level > player.unlocked_levels:
+                    raise ValueError("Level not unlocked")
+            finally:
+                db.close()
+            network = get_level(level)
+        return sessions.start(player_id, network).state()
+
+    session = sessions.get(player_id)
+    if session is None:
+        raise ValueError("No active session, send a start message")
+    with session.lock:
+        if kind == "resume":
+            return session.state()
+        if kind == "switch":
+            req = TopologyChangeRequest(
+                line_id=str(message.get("line_id")),
+                direction=str(message.get("direction")),
+            )
+            return session.switch(req)
+        if kind == "redispatch":
+            delta = message.get("delta")
+            if not isinstance(delta, (int, float)):
+                raise ValueError("Redispatch delta must be a number")
+            return session.redispatch(str(message.get("node_id")), float(delta))
+    raise ValueError(f"Unknown message type '{kind}'")
+
+
+@router.websocket("/play")
+async def play(websocket: WebSocket, token: str = ""):
+    """
+    Live play session. Browsers cannot set headers on a WebSocket, so the
+    access token is passed as a query parameter. JSON messages:
+
+    - {"type": "start", "level": n} or {"type": "start", "daily": true}
+    - {"type": "resume"} — resend the full state of the current session
+    - {"type": "switch", "line_id": "L1-2", "direction": "to" | "from"}
+    - {"type": "redispatch", "node_id": "3", "delta": 1}
+
+    Start and resume reply with the full network; switch and redispatch
+    reply with only the changed flows (see PlaySession).
+    """
+    player_id = await run_in_threadpool(_websocket_player_id, token)
+    if player_id is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects")
+                reply = await run_in_threadpool(_handle_play_message, player_id, message)
+            except ValueError as e:
+                reply = {"type": "error", "detail": str(e)}
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        # The session stays in the store until its TTL, so a dropped
+        # connection can reconnect and resume.
+        pass
+
+
+async def _fresh_catalog():
+    # Rescans read files, so they run off the event loop.
+    if catalog.is_stale():
+        await run_in_threadpool(catalog.rescan)
+
+
 @router.get("/generated_network/count")
-def generated_network_count(player: Player = Depends(get_current_player)):
-    return {"count": len(_generated_network_files())}
+async def generated_network_count(player_id: int = Depends(get_current_player_id)):
+    await _fresh_catalog()
+    return {"count": catalog.count()}
+
+
+@router.get("/generated_network/search")
+async def search_generated_networks(
+    difficulty: Optional[str] = None,
+    min_nodes: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    min_lines: Optional[int] = None,
+    max_lines: Optional[int] = None,
+    player_id: int = Depends(get_current_player_id),
+):
+    """Metadata of the generated networks matching all given filters; fetch
+    one with /generated_network/{index}."""
+    await _fresh_catalog()
+    return catalog.search(difficulty, min_nodes, max_nodes, min_lines, max_lines)
 
 
 @router.get("/generated_network/{index}")
-def get_generated_network(index: int, player: Player = Depends(get_current_player)):
-    files = _generated_network_files()
-    if not files:
-        raise HTTPException(status_code=404, detail="No generated networks available")
-    with open(files[index % len(files)]) as f:
-        data = json.load(f)
-    return dict_to_network_state(data)
+async def get_generated_network(
+    index: int,
+    request: Request,
+    player_id: int = Depends(get_current_player_id),
+):
+    await _fresh_catalog()
+    try:
+        entry, network = catalog.get(index)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    payload = cached_payload(("generated", entry.name), network, network.model_dump)
+    return payload_response(request, payload)
 
 
 @app.get("/privacy", response_class=HTMLResponse)
@@ -488,4 +989,28 @@ def apple_app_site_association():
         media_type="application/json",
     )
 
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until the background warm-up has filled the caches."""
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(request: Request):
+    """Metrics of this worker process, in the Prometheus text format. Only
+    for scrapers with the metrics token; a 404 to everyone else."""
+    if not metrics.authorized(request.headers):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return metrics.render()
+
 app.include_router(router)
+
+startup.record("import", startup.PROCESS_STARTED)
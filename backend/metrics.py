@@ -0,0 +1,231 @@
+"""
+Process-local metrics, exported in the Prometheus text format at /metrics.
+
+Counters and histograms take an optional tuple of label values. Updates
+take a short uncontended lock, so code in hot loops (the solver) counts
+in local variables and adds the totals once per call instead of calling
+inc() per iteration. Work done in the CPU process pool is counted in the
+pool process and merged back into the server process with each result
+(see executors.py).
+
+Each worker process keeps its own values; scrape every worker (or sum the
+series) for totals. Set CONGEST_METRICS=0 to turn all updates into no-ops
+and drop the request middleware.
+
+/metrics is only served with CONGEST_METRICS_TOKEN set, to scrapers that
+send it as `Authorization: Bearer <token>`; otherwise it is a 404.
+"""
+import bisect
+import hmac
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("CONGEST_METRICS", "1") != "0"
+TOKEN = os.environ.get("CONGEST_METRICS_TOKEN") or None
+
+# Upper bounds (seconds) of the default latency buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, delta: dict):
+        with self._lock:
+            for labels, amount in delta.items():
+                self._values[labels] = self._values.get(labels, 0) + amount
+
+    @staticmethod
+    def diff(after: dict, before: dict) -> dict:
+        return {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in self.snapshot().items()
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS, label_names: tuple = ()
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        # labels -> [count per bucket (last one is +Inf)..., sum]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()):
+        if not ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * (len(self.buckets) + 2)
+            data[i] += 1
+            data[-1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: list(v) for k, v in self._values.items()}
+
+    def merge(self, delta: dict):
+        with self._lock:
+            for labels, values in delta.items():
+                data = self._values.setdefault(labels, [0] * (len(self.buckets) + 2))
+                for i, v in enumerate(values):
+                    data[i] += v
+
+    @staticmethod
+    def diff(after: dict, before: dict) -> dict:
+        delta = {}
+        for labels, values in after.items():
+            old = before.get(labels)
+            if old != values:
+                delta[labels] = values if old is None else [a - b for a, b in zip(values, old)]
+        return delta
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, data in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), data[:-1]):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {data[-1]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+_registry: dict[str, Counter | Histogram] = {}
+
+
+def counter(name: str, help_text: str, label_names: tuple = ()) -> Counter:
+    """Create and register a counter. Names should end in _total."""
+    metric = Counter(name, help_text, label_names)
+    _registry[name] = metric
+    return metric
+
+
+def histogram(
+    name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS, label_names: tuple = ()
+) -> Histogram:
+    metric = Histogram(name, help_text, buckets, label_names)
+    _registry[name] = metric
+    return metric
+
+
+def snapshot() -> dict:
+    return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def changes_since(before: dict) -> dict:
+    """What every metric gained since snapshot() returned `before`."""
+    delta = {}
+    for name, metric in _registry.items():
+        changed = metric.diff(metric.snapshot(), before.get(name, {}))
+        if changed:
+            delta[name] = changed
+    return delta
+
+
+def merge(delta: dict):
+    """Add changes_since() output from another process. Metrics this
+    process doesn't know are ignored."""
+    for name, values in delta.items():
+        metric = _registry.get(name)
+        if metric is not None:
+            metric.merge(values)
+
+
+def authorized(headers) -> bool:
+    """True if `headers` carry the scrape token."""
+    if TOKEN is None:
+        return False
+    scheme, _, value = headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(value.encode(), TOKEN.encode())
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = counter(
+    "congest_http_requests_total", "HTTP requests by route and status",
+    ("method", "route", "status"),
+)
+REQUEST_SECONDS = histogram(
+    "congest_http_request_duration_seconds", "HTTP request latency by route",
+    label_names=("method", "route"),
+)
+
+
+class RouteMetricsMiddleware:
+    """ASGI middleware recording REQUESTS and REQUEST_SECONDS. Routes are
+    labelled by their path template (/api/level_stats/{level}), so the
+    number of series stays bounded."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, (scope["method"], route))
+            REQUESTS.inc(1, (scope["method"], route, str(status)))
@@ -0,0 +1,160 @@
+"""
+Versioned schema migrations.
+
+Applied versions are recorded in the schema_version table, so each
+migration runs once per database rather than on every import. Run them
+with `python -m backend.migrations`; the app also runs any pending ones
+at startup. Fresh databases get the current schema from create_all, so
+every migration must be a no-op when its change is already present.
+
+On PostgreSQL an advisory lock makes concurrent workers wait for the first
+one to finish. SQLite has no equivalent, but the steps are idempotent, so
+two processes racing through them end in the same state.
+"""
+import logging
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from .database import Base, engine as default_engine
+from .models import parse_level_stars
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock, shared by every worker.
+_ADVISORY_LOCK_KEY = 804_113
+
+# Players backfilled per transaction, so SQLite writers are only blocked
+# for one batch at a time.
+BACKFILL_BATCH_SIZE = int(os.environ.get("CONGEST_MIGRATION_BATCH_SIZE", 500))
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """Add a column unless it exists. Returns True if it was added."""
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _daily_and_stars_columns(conn: Connection):
+    _add_column(conn, "players", "daily_solved_date", "VARCHAR DEFAULT NULL")
+    _add_column(conn, "players", "daily_solved_count", "INTEGER DEFAULT 0")
+    _add_column(conn, "players", "daily_streak", "INTEGER DEFAULT 0")
+    _add_column(conn, "players", "daily_stars", "INTEGER DEFAULT 0")
+    _add_column(conn, "players", "level_stars", "VARCHAR DEFAULT '{}'")
+
+
+def _total_stars_column(conn: Connection):
+    if not _add_column(conn, "players", "total_stars", "INTEGER DEFAULT 0"):
+        return
+    # Backfill the materialized column from the level_stars blobs
+    for player_id, level_stars in conn.execute(text("SELECT id, level_stars FROM players")).all():
+        conn.execute(
+            text("UPDATE players SET total_stars = :total WHERE id = :id"),
+            {"total": sum(parse_level_stars(level_stars).values()), "id": player_id},
+        )
+
+
+def _ranking_index(conn: Connection):
+    # create_all only creates missing tables, not indexes on existing ones
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_players_ranking ON players (daily_streak, money, id)"
+    ))
+
+
+def _level_progress_from_blobs(conn: Connection):
+    # Players that already have progress rows are skipped. Committed per
+    # batch of players; rows another process inserted first are left alone.
+    after = 0
+    while True:
+        pending = conn.execute(
+            text(
+                "SELECT id, level_stars FROM players"
+                " WHERE id > :after AND level_stars IS NOT NULL AND level_stars != '{}'"
+                " AND id NOT IN (SELECT DISTINCT player_id FROM player_level_progress)"
+                " ORDER BY id LIMIT :batch"
+            ),
+            {"after": after, "batch": BACKFILL_BATCH_SIZE},
+        ).all()
+        if not pending:
+            return
+        rows = [
+            {"player_id": player_id, "level": level, "stars": stars}
+            for player_id, level_stars in pending
+            for level, stars in parse_level_stars(level_stars).items()
+        ]
+        if rows:
+            conn.execute(
+                text(
+                    "INSERT INTO player_level_progress (player_id, level, stars)"
+                    " VALUES (:player_id, :level, :stars)"
+                    " ON CONFLICT (player_id, level) DO NOTHING"
+                ),
+                rows,
+            )
+        conn.commit()
+        after = pending[-1][0]
+
+
+# (version, description, migration) — append only, never renumber.
+MIGRATIONS = [
+    (1, "daily challenge and level stars columns", _daily_and_stars_columns),
+    (2, "materialized total_stars column", _total_stars_column),
+    (3, "leaderboard ranking index", _ranking_index),
+    (4, "player_level_progress from level_stars blobs", _level_progress_from_blobs),
+]
+
+
+def _applied_versions(conn: Connection) -> set[int]:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " description VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def run_migrations(engine: Engine = default_engine) -> list[int]:
+    """Create missing tables and apply pending migrations. Returns the
+    versions applied by this call."""
+    Base.metadata.create_all(bind=engine)
+
+    applied = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+        try:
+            done = _applied_versions(conn)
+            conn.commit()
+            for version, description, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info("Applying migration %d: %s", version, description)
+                migrate(conn)
+                try:
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                        {"v": version, "d": description},
+                    )
+                    conn.commit()
+                except IntegrityError:
+                    # Another process applied it concurrently (SQLite only).
+                    conn.rollback()
+                    continue
+                applied.append(version)
+        finally:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+                conn.commit()
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    versions = run_migrations()
+    print(f"Applied migrations: {versions or 'none (up to date)'}")
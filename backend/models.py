@@ -1,13 +1,28 @@
 from typing import Optional
+import datetime
 import json
 
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
 
 
+def parse_level_stars(level_stars: Optional[str]) -> dict[int, int]:
+    """Decode a legacy level_stars blob into {level: stars}."""
+    try:
+        return {int(k): v for k, v in json.loads(level_stars or "{}").items()}
+    except (ValueError, TypeError, AttributeError):
+        return {}
+
+
 class Player(Base):
     __tablename__ = "players"
+    __table_args__ = (
+        # Leaderboard order: daily_streak DESC, money DESC, id DESC is a
+        # backward scan of this index.
+        Index("ix_players_ranking", "daily_streak", "money", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     username: Mapped[str] = mapped_column(unique=True, index=True)
@@ -25,20 +40,19 @@ class Player(Base):
     # Best star rating (1-3) earned on the daily problem matching daily_solved_date
     daily_stars: Mapped[int] = mapped_column(default=0)
 
-    # JSON-serialized {level_num: stars} map of the best stars ever earned per level
+    # Legacy JSON-serialized {level_num: stars} map, superseded by
+    # PlayerLevelProgress. Only read to migrate existing players.
     level_stars: Mapped[str] = mapped_column(default="{}")
+    # Sum of the player's best stars over all levels, kept in sync by
+    # progress.award_level_solution so the leaderboard doesn't have to sum them.
+    total_stars: Mapped[int] = mapped_column(default=0)
 
-    def get_level_stars(self):
-        try:
-            return {int(k): v for k, v in json.loads(self.level_stars or "{}").items()}
-        except (ValueError, TypeError):
-            return {}
+    progress: Mapped[list["PlayerLevelProgress"]] = relationship(
+        back_populates="player", cascade="all, delete-orphan"
+    )
 
-    def set_level_stars(self, level_stars: dict):
-        self.level_stars = json.dumps(level_stars)
-
-    def total_stars(self):
-        return sum(self.get_level_stars().values())
+    def get_level_stars(self):
+        return {p.level: p.stars for p in self.progress}
 
     def package_data(self):
         return {
@@ -51,5 +65,27 @@ class Player(Base):
             "daily_streak": self.daily_streak or 0,
             "daily_stars": self.daily_stars or 0,
             "level_stars": self.get_level_stars(),
-            "total_stars": self.total_stars(),
+            "total_stars": self.total_stars or 0,
         }
+
+
+class PlayerLevelProgress(Base):
+    """Best result of one player on one campaign level."""
+    __tablename__ = "player_level_progress"
+    __table_args__ = (
+        # Per-level aggregates, e.g. how many players 3-starred a level.
+        Index("ix_player_level_progress_level_stars", "level", "stars"),
+    )
+
+    player_id: Mapped[int] = mapped_column(
+        ForeignKey("players.id", ondelete="CASCADE"), primary_key=True
+    )
+    level: Mapped[int] = mapped_column(primary_key=True)
+    stars: Mapped[int] = mapped_column(default=0)
+    # Both None for progress migrated from the legacy level_stars blob
+    best_redispatch_cost: Mapped[Optional[float]] = mapped_column(default=None)
+    solved_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        default=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
+
+    player: Mapped[Player] = relationship(back_populates="progress")
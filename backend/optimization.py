@@ -0,0 +1,368 @@
+"""
+Exact solvers for redispatch, on top of the switching search in network.py.
+
+- optimal_redispatch: the cheapest balanced redispatch that brings every
+  line of the current topology within its limit. A linear program over the
+  PTDF (scipy.optimize.linprog), solved in milliseconds.
+- optimal_switching_redispatch: switch positions and redispatch chosen
+  together (scipy.optimize.milp), minimising redispatch cost first and the
+  number of switches second. Bus splitting makes this a hard MILP, so it
+  starts from the switching search's solution and runs under the solver
+  timeout; on most shipped levels it proves its result optimal within a
+  few seconds.
+
+Adjustments are continuous MW, while the player redispatches in whole MW,
+so the cost they report is a lower bound on what a player can reach.
+"""
+import logging
+import time
+
+import numpy as np
+
+from . import network as net
+from .schemas import NetworkState, TopologyChangeRequest
+
+logger = logging.getLogger(__name__)
+
+# Line limits are tightened by this much (MW) in the optimisation, so that
+# solver tolerances don't leave a line a hair over its limit (and the
+# state at a non-zero cost) when the power flow is recomputed.
+LIMIT_MARGIN = 1e-4
+
+# Adjustments smaller than this (MW) are solver noise and dropped.
+MIN_ADJUSTMENT = 1e-7
+
+
+def _base_injections(network: NetworkState) -> dict[str, float]:
+    """Injections of `network` with its current redispatch undone."""
+    adjustments = network.redispatch.get("adjustments", {})
+    return {
+        node_id: node.injection - adjustments.get(node_id, 0.0)
+        for node_id, node in network.nodes.items()
+    }
+
+
+def _apply_redispatch(network: NetworkState, base: dict, adjustments: dict) -> NetworkState:
+    """Set injections to `base` plus `adjustments` and recompute the flows."""
+    for node_id, node in network.nodes.items():
+        node.injection = base.get(node_id, 0.0) + adjustments.get(node_id, 0.0)
+    network.redispatch = {"cost": 0.0, "unbalance": 0.0, "adjustments": adjustments}
+    network.redispatch["cost"] = net.calculate_redispatch_cost(network)
+    return net.calculate_power_flow(network)
+
+
+def _adjustments(node_ids: list[str], up: np.ndarray, down: np.ndarray) -> dict[str, float]:
+    return {
+        node_id: float(u - d)
+        for node_id, u, d in zip(node_ids, up, down)
+        if abs(u - d) > MIN_ADJUSTMENT
+    }
+
+
+def validate_costs(network: NetworkState):
+    """
+    Raise ValueError if a node has cost_increase + cost_decrease < 0.
+    Raising and lowering such a node at once would earn money without
+    changing any flow, so the cheapest redispatch would be unbounded.
+    Redispatch between different nodes is bounded by the line limits.
+    """
+    for node in network.nodes.values():
+        if node.cost_increase + node.cost_decrease < 0:
+            raise ValueError(
+                f"Node {node.id} has cost_increase + cost_decrease < 0, "
+                "so its redispatch cost is unbounded"
+            )
+
+
+def _record(kind: str, outcome: str, started: float):
+    net.SOLVER_RUNS.inc(1, (kind, outcome))
+    net.SOLVER_SECONDS.observe(time.perf_counter() - started, (kind,))
+
+
+def optimal_redispatch(network: NetworkState) -> NetworkState | None:
+    """
+    Cheapest balanced redispatch for the current topology of `network`.
+
+    Minimises sum(cost_increase * up + cost_decrease * down) over
+    up, down >= 0 per node (b nodes have no generation to redispatch),
+    subject to sum(up - down) = 0 and |flow0 + PTDF (up - down)| <= limit
+    on every line. Any redispatch already in the network is replaced.
+
+    Returns a copy of the network with the adjustments applied, or None if
+    the topology is split into islands (never a solution) or the LP solver
+    fails. Raises ValueError if a node's costs make the LP unbounded (see
+    validate_costs).
+    """
+    from scipy.optimize import linprog
+
+    validate_costs(network)
+    started = time.perf_counter()
+    network = network.model_copy(deep=True)
+    base = _base_injections(network)
+    for node_id, node in network.nodes.items():
+        node.injection = base[node_id]
+    node_ids = network.bus_ids()
+    if not node_ids or not network.lines:
+        _record("lp", "solved", started)
+        return _apply_redispatch(network, base, {})
+    ptdf = net.compute_ptdf(network)
+    if ptdf is None:
+        _record("lp", "split", started)
+        return None
+    flows0 = np.array([line.flow for line in net.calculate_power_flow(network).lines.values()])
+    limits = np.array([line.limit for line in network.lines.values()]) - LIMIT_MARGIN
+
+    buses = set(node_ids)
+    columns = [i for i, node_id in enumerate(network.nodes) if node_id in buses]
+    k = len(node_ids)
+    sensitivity = ptdf[:, columns]
+    # x = [up (k), down (k)]
+    c = np.array(
+        [network.nodes[n].cost_increase for n in node_ids]
+        + [network.nodes[n].cost_decrease for n in node_ids],
+        dtype=float,
+    )
+    flow_rows = np.hstack([sensitivity, -sensitivity])
+    result = linprog(
+        c,
+        A_ub=np.vstack([flow_rows, -flow_rows]),
+        b_ub=np.concatenate([limits - flows0, limits + flows0]),
+        A_eq=np.concatenate([np.ones(k), -np.ones(k)])[None, :],
+        b_eq=[0.0],
+        bounds=(0, None),
+        method="highs",
+    )
+    if result.status != 0:
+        # Not expected for a connected topology: removing every injection
+        # is always feasible, and validate_costs rules out an unbounded
+        # objective. Left for numerical trouble in the solver.
+        logger.warning("Redispatch LP failed: %s", result.message)
+        _record("lp", "failed", started)
+        return None
+
+    adjustments = _adjustments(node_ids, result.x[:k], result.x[k:])
+    _record("lp", "solved", started)
+    return _apply_redispatch(network, base, adjustments)
+
+
+def optimal_switching_redispatch(network: NetworkState) -> NetworkState | None:
+    """
+    Switch positions and redispatch chosen together: the cheapest
+    redispatch over every topology reachable by switching, and among
+    those the one with the fewest switches.
+
+    Every line endpoint has a binary switch bit (1 = moved to the node's
+    b bus). Flows follow the DC model through bus angles, with big-M
+    constraints picking the angle of the bus each endpoint is on. A second,
+    single-commodity flow from the first node to every bus in use keeps the
+    topology connected, since split states never count as solutions.
+
+    Solves from the original topology of `network` (its switches and
+    redispatch are ignored) and returns it switched and redispatched, or
+    None if the solver timed out before finding a solution. The switching
+    search and the MILP share one SOLVER_TIMEOUT_SECONDS budget. Raises
+    ValueError like optimal_redispatch.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    validate_costs(network)
+    started = time.perf_counter()
+    deadline = started + net.SOLVER_TIMEOUT_SECONDS
+    network = net.reset_all_switches(network.model_copy(deep=True))
+    base = _base_injections(network)
+    network.redispatch = {"cost": 0.0, "unbalance": 0.0, "adjustments": {}}
+    if not network.lines:
+        _record("milp", "solved", started)
+        return _apply_redispatch(network, base, {})
+
+    node_ids = list(network.nodes)
+    lines = list(network.lines.values())
+    n, m = len(node_ids), len(lines)
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    ends = [(index[line.from_node], index[line.to_node]) for line in lines]
+    limits = np.array([line.limit for line in lines])
+
+    # Angle differences along any path are bounded by the limits of its
+    # (at most 2n - 1) lines.
+    max_angle = float(limits.sum())
+    big_angle = 2 * max_angle
+    buses = 2 * n  # bus i is node i, bus n + i its b node
+
+    # Variable layout
+    layout = {}
+    size = 0
+    for name, count in (
+        ("theta", buses),     # bus angles
+        ("a", m),             # angle at the from end of each line
+        ("b", m),             # angle at the to end
+        ("f", m),             # line flows
+        ("gf0", m), ("gf1", m), ("gt0", m), ("gt1", m),  # flow at each end, per bus
+        ("sf", m), ("st", m),  # switch bits at the from/to end
+        ("up", n), ("down", n),
+        ("used", n),          # b bus of node i has lines
+        ("cf0", m), ("cf1", m), ("ct0", m), ("ct1", m),  # connectivity commodity
+        ("c", m),
+    ):
+        layout[name] = np.arange(size, size + count)
+        size += count
+
+    lower = np.full(size, -np.inf)
+    upper = np.full(size, np.inf)
+    integrality = np.zeros(size)
+    objective = np.zeros(size)
+
+    def bound(name, lo, hi):
+        lower[layout[name]] = lo
+        upper[layout[name]] = hi
+
+    bound("theta", -max_angle, max_angle)
+    lower[layout["theta"][0]] = upper[layout["theta"][0]] = 0.0
+    bound("a", -max_angle, max_angle)
+    bound("b", -max_angle, max_angle)
+    bound("f", -(limits - LIMIT_MARGIN), limits - LIMIT_MARGIN)
+    for name in ("gf0", "gf1", "gt0", "gt1"):
+        bound(name, -limits, limits)
+    for name in ("sf", "st", "used"):
+        bound(name, 0, 1)
+        integrality[layout[name]] = 1
+    bound("up", 0, np.inf)
+    bound("down", 0, np.inf)
+    for name in ("cf0", "cf1", "ct0", "ct1", "c"):
+        bound(name, -buses, buses)
+
+    objective[layout["up"]] = [network.nodes[i].cost_increase for i in node_ids]
+    objective[layout["down"]] = [network.nodes[i].cost_decrease for i in node_ids]
+
+    rows, row_lower, row_upper = [], [], []
+
+    def constrain(terms, lo, hi):
+        row = np.zeros(size)
+        for name, i, coefficient in terms:
+            row[layout[name][i]] += coefficient
+        rows.append(row)
+        row_lower.append(lo)
+        row_upper.append(hi)
+
+    for ell, (u, v) in enumerate(ends):
+        # The end angle equals the angle of the bus the end is switched to:
+        # |a - theta_u| <= M sf and |a - theta_ub| <= M (1 - sf).
+        for end, bit, node in (("a", "sf", u), ("b", "st", v)):
+            constrain([(end, ell, 1), ("theta", node, -1), (bit, ell, -big_angle)], -np.inf, 0)
+            constrain([(end, ell, 1), ("theta", node, -1), (bit, ell, big_angle)], 0, np.inf)
+            constrain([(end, ell, 1), ("theta", n + node, -1), (bit, ell, big_angle)], -np.inf, big_angle)
+            constrain([(end, ell, 1), ("theta", n + node, -1), (bit, ell, -big_angle)], -big_angle, np.inf)
+        constrain([("f", ell, 1), ("a", ell, -1), ("b", ell, 1)], 0, 0)
+
+        # The flow (and commodity) leaves through the bus of each end:
+        # x0 + x1 = x, |x0| <= M (1 - bit), |x1| <= M bit.
+        for total, parts, bit, big in (
+            ("f", ("gf0", "gf1"), "sf", limits[ell]),
+            ("f", ("gt0", "gt1"), "st", limits[ell]),
+            ("c", ("cf0", "cf1"), "sf", buses),
+            ("c", ("ct0", "ct1"), "st", buses),
+        ):
+            main, moved = parts
+            constrain([(main, ell, 1), (moved, ell, 1), (total, ell, -1)], 0, 0)
+            constrain([(main, ell, 1), (bit, ell, big)], -np.inf, big)
+            constrain([(main, ell, 1), (bit, ell, -big)], -big, np.inf)
+            constrain([(moved, ell, 1), (bit, ell, -big)], -np.inf, 0)
+            constrain([(moved, ell, 1), (bit, ell, big)], 0, np.inf)
+
+    incident = [[] for _ in range(n)]
+    for ell, (u, v) in enumerate(ends):
+        incident[u].append((ell, "f"))
+        incident[v].append((ell, "t"))
+
+    for i, node_id in enumerate(node_ids):
+        # Power balance of the main bus and the b bus.
+        main = [(f"g{side}0", ell, 1 if side == "f" else -1) for ell, side in incident[i]]
+        moved = [(f"g{side}1", ell, 1 if side == "f" else -1) for ell, side in incident[i]]
+        constrain(main + [("up", i, -1), ("down", i, 1)], base[node_id], base[node_id])
+        constrain(moved, 0, 0)
+
+        # The b bus is in use iff one of the node's line ends is on it.
+        bits = [("sf" if side == "f" else "st", ell, 1) for ell, side in incident[i]]
+        for bit in bits:
+            constrain([bit, ("used", i, -1)], -np.inf, 0)
+        constrain(bits + [("used", i, -1)], 0, np.inf)
+
+        # Connectivity: the first bus sends one unit of commodity to every
+        # other main bus and every b bus in use.
+        main = [(f"c{side}0", ell, -1 if side == "f" else 1) for ell, side in incident[i]]
+        moved = [(f"c{side}1", ell, -1 if side == "f" else 1) for ell, side in incident[i]]
+        if i == 0:
+            constrain(main + [("used", j, 1) for j in range(n)], -(n - 1), -(n - 1))
+        else:
+            constrain(main, 1, 1)
+        constrain(moved + [("used", i, -1)], 0, 0)
+
+    constrain([("up", i, 1) for i in range(n)] + [("down", i, -1) for i in range(n)], 0, 0)
+
+    # The stubs type lb/ub as float; arrays are accepted.
+    constraints = [LinearConstraint(np.array(rows), row_lower, row_upper)]  # type: ignore[arg-type]
+    switch_count = np.zeros(size)
+    switch_count[layout["sf"]] = 1
+    switch_count[layout["st"]] = 1
+
+    def solve(goal, max_redispatch_cost):
+        cap = LinearConstraint(objective[None, :], -np.inf, max_redispatch_cost)
+        return milp(
+            goal,
+            constraints=constraints + [cap],
+            integrality=integrality,
+            bounds=Bounds(lower, upper),  # type: ignore[arg-type]
+            options={"time_limit": max(0.0, deadline - time.perf_counter())},
+        )
+
+    # The switching search usually finds a zero-cost topology quickly. When
+    # no redispatch can earn money (every cost_increase + cost_decrease
+    # pair is >= 0), zero redispatch is then optimal, and the MILP only has
+    # to look for fewer switches than the search used, which is much faster
+    # than minimising the redispatch cost. If it runs out of time the search
+    # result stands. The search only gets what is left of the budget.
+    x, proven = None, False
+    ci = [network.nodes[i].cost_increase for i in node_ids]
+    cd = [network.nodes[i].cost_decrease for i in node_ids]
+    if min(ci) + min(cd) >= 0:
+        searched = net.solve_network(
+            network.model_copy(deep=True), timeout=deadline - time.perf_counter()
+        )
+        if searched.cost == 0.0:
+            switches = net._count_switches(searched)
+            if switches == 0:
+                _record("milp", "solved", started)
+                return searched
+            if time.perf_counter() >= deadline:
+                _record("milp", "timeout", started)
+                return searched
+            constraints.append(LinearConstraint(switch_count[None, :], 0, switches - 1))
+            result = solve(switch_count, 0.0)
+            if result.x is None:
+                # Infeasible: the search already used the fewest switches.
+                _record("milp", "solved" if result.status == 2 else "timeout", started)
+                return searched
+            x, proven = result.x, result.status == 0
+
+    if x is None:
+        if time.perf_counter() >= deadline:
+            _record("milp", "timeout", started)
+            return None
+        cheapest = solve(objective, np.inf)
+        if cheapest.x is None:
+            logger.warning("Switching + redispatch MILP found no solution: %s", cheapest.message)
+            _record("milp", "timeout" if cheapest.status == 1 else "failed", started)
+            return None
+        result = solve(switch_count, cheapest.fun + 1e-6 * max(1.0, abs(cheapest.fun)))
+        if result.x is None:
+            result = cheapest
+        x, proven = result.x, result.status == 0
+
+    for ell, line in enumerate(lines):
+        for bit, direction in (("st", "to"), ("sf", "from")):
+            if x[layout[bit][ell]] > 0.5:
+                # Switching renames the line; its index stays.
+                line_id = next(other.id for other in network.lines.values() if other.index == line.index)
+                net.update_network(network, TopologyChangeRequest(line_id=line_id, direction=direction))
+    adjustments = _adjustments(node_ids, x[layout["up"]], x[layout["down"]])
+    _record("milp", "solved" if proven else "timeout", started)
+    return _apply_redispatch(network, base, adjustments)
@@ -0,0 +1,193 @@
+"""
+Opt-in profiling of slow solves and requests.
+
+Both triggers are off by default:
+
+- CONGEST_PROFILE=1 runs every solve_network/generate_network call the
+  server makes under cProfile, in the process that executes it (the CPU
+  pool).
+- With CONGEST_PROFILE_TOKEN set, a request sent with the header
+  `X-Congest-Profile: <token>` is profiled by sampling the stacks of all
+  threads while it runs, and a solve it triggers runs under cProfile.
+
+Output goes to CONGEST_PROFILE_DIR (default profiles/): `.pstats` files
+(`python -m pstats`, snakeviz, flameprof) and `.folded` collapsed stacks
+(flamegraph.pl, speedscope). Solver profiles are named after the level and
+a hash of the network, so runs on the same state can be compared.
+
+When neither is configured the only cost is a boolean check per solve; the
+request middleware isn't installed.
+"""
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from .schemas import NetworkState
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.environ.get("CONGEST_PROFILE_DIR", "profiles"))
+ALWAYS = os.environ.get("CONGEST_PROFILE", "0") == "1"
+PROFILE_TOKEN = os.environ.get("CONGEST_PROFILE_TOKEN") or None
+HEADER = "X-Congest-Profile"
+
+# Seconds between stack samples of a profiled request.
+SAMPLE_INTERVAL = float(os.environ.get("CONGEST_PROFILE_SAMPLE_INTERVAL", 0.005))
+
+
+def network_hash(network: NetworkState) -> str:
+    """Short hash of the topology and injections of `network`."""
+    h = hashlib.sha256()
+    for line_id in sorted(network.lines):
+        h.update(line_id.encode())
+        h.update(b"\0")
+    for node_id in sorted(network.nodes):
+        h.update(f"{node_id}={network.nodes[node_id].injection!r};".encode())
+    return h.hexdigest()[:12]
+
+
+def network_tag(network: NetworkState) -> str:
+    level = f"level{network.level}" if network.level is not None else "nolevel"
+    return f"{level}-{network_hash(network)}"
+
+
+def _output_path(kind: str, tag: str, suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    tag = re.sub(r"[^A-Za-z0-9_.-]+", "_", tag).strip("_")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return PROFILE_DIR / f"{stamp}-{os.getpid()}-{kind}-{tag}{suffix}"
+
+
+def requested(headers) -> bool:
+    """True if the request headers ask for profiling with the right token."""
+    if PROFILE_TOKEN is None:
+        return False
+    value = headers.get(HEADER)
+    return value is not None and hmac.compare_digest(value, PROFILE_TOKEN)
+
+
+def run_profiled(fn, *args):
+    """fn(*args) under cProfile, saving the stats. Module-level so that it
+    can be sent to the process pool."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active in this thread
+        return fn(*args)
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+    # Name the profile after the network solved, or the one generated.
+    network = args[0] if args and isinstance(args[0], NetworkState) else result
+    tag = network_tag(network) if isinstance(network, NetworkState) else "none"
+    path = _output_path(fn.__name__, tag, ".pstats")
+    profiler.dump_stats(path)
+    logger.info("Profiled %s (%s) in %.3fs: %s", fn.__name__, tag, elapsed, path)
+    return result
+
+
+def wrap(fn, *args, force: bool = False) -> tuple:
+    """(callable, args) to run fn(*args), profiled if CONGEST_PROFILE is on
+    or `force` is set. For executors.run_cpu(*wrap(...))."""
+    if ALWAYS or force:
+        return (run_profiled, fn) + args
+    return (fn,) + args
+
+
+class StackSampler:
+    """Samples the Python stacks of every thread in a background thread and
+    counts them as collapsed ("folded") stacks. Unlike cProfile it sees the
+    threadpool running sync routes, not just the event loop."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    where = f"{Path(code.co_filename).name}:{code.co_firstlineno}"
+                    stack.append(f"{code.co_name} ({where})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, path: Path):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+_sampling = threading.Lock()
+
+
+class ProfileRequestMiddleware:
+    """ASGI middleware sampling requests sent with a valid X-Congest-Profile
+    header. One request is sampled at a time; the response carries the
+    output file name in the same header."""
+
+    def __init__(self, app):
+        self.app = app
+        self._header = HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or PROFILE_TOKEN is None:
+            await self.app(scope, receive, send)
+            return
+        value = dict(scope["headers"]).get(self._header)
+        if value is None or not hmac.compare_digest(value, PROFILE_TOKEN.encode()):
+            await self.app(scope, receive, send)
+            return
+        if not _sampling.acquire(blocking=False):
+            logger.info("Profile of %s skipped: another request is being profiled", scope["path"])
+            await self.app(scope, receive, send)
+            return
+
+        path = _output_path("request", f"{scope['method']}{scope['path']}", ".folded")
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((self._header, path.name.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = StackSampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            sampler.stop(path)
+            _sampling.release()
+            logger.info(
+                "Profiled %s %s in %.3fs: %s",
+                scope["method"], scope["path"], time.perf_counter() - started, path,
+            )
@@ -0,0 +1,137 @@
+"""
+Reward and progress writes for solved levels and daily problems.
+
+Each award is a conditional UPDATE (or an upsert) that reads and writes the
+player's row in a single statement, so two concurrent submissions cannot
+both see a level as new and both collect the reward. Callers run these
+only after the power flow has validated the solution and commit right
+away, which keeps the write transaction (and SQLite's write lock) short.
+"""
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Player, PlayerLevelProgress
+
+# Coins for the first solve of the newest unlocked level / of the daily.
+LEVEL_REWARD = 50
+DAILY_REWARD = 50
+
+
+def _execute_update(db: Session, stmt) -> int:
+    # The ORM can't evaluate these CASE expressions in Python; the caller's
+    # commit expires the loaded Player instead.
+    result = db.execute(stmt.execution_options(synchronize_session=False))
+    return result.rowcount  # type: ignore[attr-defined]
+
+
+def _upsert_progress(db: Session, player_id: int, level: int, stars: int, redispatch_cost: float):
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(PlayerLevelProgress).values(
+        player_id=player_id,
+        level=level,
+        stars=stars,
+        best_redispatch_cost=redispatch_cost,
+    )
+    existing = PlayerLevelProgress.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[existing.player_id, existing.level],
+        set_={
+            "stars": case(
+                (existing.stars < stmt.excluded.stars, stmt.excluded.stars),
+                else_=existing.stars,
+            ),
+            "best_redispatch_cost": case(
+                (
+                    existing.best_redispatch_cost.is_(None)
+                    | (stmt.excluded.best_redispatch_cost < existing.best_redispatch_cost),
+                    stmt.excluded.best_redispatch_cost,
+                ),
+                else_=existing.best_redispatch_cost,
+            ),
+        },
+    )
+    db.execute(stmt)
+
+
+def award_level_solution(
+    db: Session, player_id: int, level: int, stars: int, redispatch_cost: float
+) -> tuple[int, int]:
+    """
+    Record a valid solve of `level`. The next level is unlocked and the
+    reward paid only if the player was still on their newest unlocked
+    level; the redispatch cost is always charged. Returns (reward, best
+    stars on the level). Does not commit.
+    """
+    unlocked = _execute_update(
+        db,
+        update(Player)
+        .where(Player.id == player_id, Player.unlocked_levels == Player.current_level)
+        .values(
+            unlocked_levels=Player.unlocked_levels + 1,
+            money=Player.money + LEVEL_REWARD,
+        ),
+    )
+    cost = round(redispatch_cost)
+    if cost:
+        _execute_update(
+            db,
+            update(Player).where(Player.id == player_id).values(money=Player.money - cost),
+        )
+
+    _upsert_progress(db, player_id, level, stars, redispatch_cost)
+    total_stars = (
+        select(func.coalesce(func.sum(PlayerLevelProgress.stars), 0))
+        .where(PlayerLevelProgress.player_id == player_id)
+        .scalar_subquery()
+    )
+    _execute_update(
+        db, update(Player).where(Player.id == player_id).values(total_stars=total_stars)
+    )
+    best_stars = db.execute(
+        select(PlayerLevelProgress.stars).where(
+            PlayerLevelProgress.player_id == player_id,
+            PlayerLevelProgress.level == level,
+        )
+    ).scalar_one()
+    return (LEVEL_REWARD if unlocked else 0), best_stars
+
+
+def award_daily_solution(db: Session, player_id: int, today: str, yesterday: str, stars: int) -> int:
+    """
+    Record a valid solve of the daily problem dated `today`. The first solve
+    of the day extends (or restarts) the streak and pays the reward; later
+    solves can only raise the day's star rating. Returns the reward. Does
+    not commit.
+    """
+    first_solve = _execute_update(
+        db,
+        update(Player)
+        .where(
+            Player.id == player_id,
+            (Player.daily_solved_date.is_(None)) | (Player.daily_solved_date != today),
+        )
+        .values(
+            daily_streak=case(
+                (Player.daily_solved_date == yesterday, func.coalesce(Player.daily_streak, 0) + 1),
+                else_=1,
+            ),
+            daily_solved_count=func.coalesce(Player.daily_solved_count, 0) + 1,
+            daily_solved_date=today,
+            daily_stars=stars,
+            money=Player.money + DAILY_REWARD,
+        ),
+    )
+    if first_solve:
+        return DAILY_REWARD
+    _execute_update(
+        db,
+        update(Player)
+        .where(
+            Player.id == player_id,
+            Player.daily_solved_date == today,
+            func.coalesce(Player.daily_stars, 0) < stars,
+        )
+        .values(daily_stars=stars),
+    )
+    return 0
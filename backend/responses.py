@@ -0,0 +1,123 @@
+"""
+Pre-serialized responses for the static network payloads.
+
+Levels, the daily problem and generated networks are the same bytes for
+every player, so they are serialized once with orjson, pre-compressed and
+served with a strong ETag. A repeat request with a matching If-None-Match
+gets an empty 304.
+"""
+import gzip
+import hashlib
+import threading
+from typing import Any, Callable, Hashable
+
+import orjson
+from fastapi import Request, Response
+
+from . import metrics
+
+try:
+    import brotli  # pyright: ignore[reportMissingImports]  # optional: `pip install brotli` for br pre-compression
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing.
+MIN_COMPRESS_BYTES = 1024
+
+
+class CachedPayload:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        # content-encoding -> pre-compressed body
+        self.encoded: dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body)
+
+
+# key -> (source object the payload was built from, payload)
+_payloads: dict[Hashable, tuple[Any, CachedPayload]] = {}
+_lock = threading.Lock()
+
+_hits = metrics.counter("congest_payload_cache_hits_total", "payload cache hits")
+_misses = metrics.counter("congest_payload_cache_misses_total", "payload cache misses")
+
+
+def cached_payload(key: Hashable, source: Any, build: Callable[[], Any]) -> CachedPayload:
+    """
+    Return the serialized payload for `key`, building it with `build()` the
+    first time. `source` is the object the payload is derived from; if a
+    different object is passed later (a reloaded level, a new daily
+    network) the payload is rebuilt.
+    """
+    entry = _payloads.get(key)
+    if entry is not None and entry[0] is source:
+        _hits.inc()
+        return entry[1]
+    _misses.inc()
+    payload = CachedPayload(orjson.dumps(build()))
+    with _lock:
+        _payloads[key] = (source, payload)
+    return payload
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # Encoded representations carry a "-gzip"/"-br" suffix but have the
+        # same content, so any of them validates the cached copy.
+        if candidate.strip('"').split("-")[0] == etag:
+            return True
+    return False
+
+
+def _encoding_weights(header: str) -> dict[str, float]:
+    """Accept-Encoding parsed into coding -> q-value (1 when not given)."""
+    weights = {}
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def payload_response(request: Request, payload: CachedPayload) -> Response:
+    """Serve `payload`, honouring If-None-Match and Accept-Encoding."""
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, payload.etag):
+        headers["ETag"] = f'"{payload.etag}"'
+        return Response(status_code=304, headers=headers)
+
+    weights = _encoding_weights(request.headers.get("accept-encoding", ""))
+    # Highest q-value wins, br before gzip on a tie; q=0 means "not this one".
+    acceptable = [
+        (weights.get(encoding, weights.get("*", 0.0)), encoding)
+        for encoding in ("br", "gzip")
+        if encoding in payload.encoded
+    ]
+    for q, encoding in sorted(acceptable, key=lambda pair: -pair[0]):
+        if q > 0:
+            headers["ETag"] = f'"{payload.etag}-{encoding}"'
+            headers["Content-Encoding"] = encoding
+            return Response(payload.encoded[encoding], media_type="application/json", headers=headers)
+
+    headers["ETag"] = f'"{payload.etag}"'
+    return Response(payload.body, media_type="application/json", headers=headers)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 from typing import List, Optional
 import json
 import os
@@ -14,12 +14,20 @@ class Node(BaseModel):
 
 
 class Line(BaseModel):
-    # TODO: add from_bus and to_bus
     id: str
+    # Node each end is connected to: its bus, or the bus's "b" node when
+    # that end is switched.
     from_node: str
     to_node: str
     flow: float = 0.0
     limit: float = 50.0
+    # Bus (base node) of each end, which switching doesn't change, and the
+    # line's position in the network it was loaded from, which stays the
+    # same while its id changes. Files written before these fields existed
+    # get them from NetworkState.
+    from_bus: str = ""
+    to_bus: str = ""
+    index: int = -1
 
 
 class NetworkState(BaseModel):
@@ -34,21 +42,76 @@ class NetworkState(BaseModel):
     level: Optional[int] = None
     tutorial_info: Optional[str] = None
     difficulty: Optional[str] = None
+    # node id -> ids of its lines, in network.lines order (a dict used as an
+    # ordered set). Built on first use by network.incident_lines() and kept
+    # up to date by update_network and reset_all_switches; code that adds
+    # or removes lines any other way must set it back to None.
+    _incident: Optional[dict[str, dict[str, None]]] = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def _fill_buses(self):
+        # Older files and clients only send from_node/to_node: a "b" node's
+        # bus is the node it was split from. Buses an end can't be on (the
+        # node is neither the bus nor its b node) are replaced the same way.
+        next_index = max((line.index for line in self.lines.values()), default=-1) + 1
+        for line in self.lines.values():
+            if line.from_node not in (line.from_bus, b_node_id(line.from_bus)):
+                line.from_bus = bus_of(line.from_node, self.nodes)
+            if line.to_node not in (line.to_bus, b_node_id(line.to_bus)):
+                line.to_bus = bus_of(line.to_node, self.nodes)
+            if line.index < 0:
+                line.index = next_index
+                next_index += 1
+        return self
+
+    def bus_ids(self) -> list[str]:
+        """Ids of the nodes that are buses, in nodes order: every node but
+        the b nodes that switched line ends were moved to."""
+        split = {line.from_node for line in self.lines.values() if line.from_node != line.from_bus}
+        split.update(line.to_node for line in self.lines.values() if line.to_node != line.to_bus)
+        return [node_id for node_id in self.nodes if node_id not in split]
 
     def __lt__(self, other):
         return self.cost < other.cost
 
 
+def b_node_id(bus: str) -> str:
+    """Id of the node that line ends of `bus` are switched to. The frontend
+    builds the same ids, and line ids and moves are made of them."""
+    return bus + "b"
+
+
+def bus_of(node_id: str, nodes: dict) -> str:
+    """Bus of an end connected to `node_id`, inverting b_node_id: for
+    input that doesn't carry from_bus/to_bus."""
+    if node_id.endswith("b") and node_id[:-1] in nodes:
+        return node_id[:-1]
+    return node_id
+
+
 class TopologyChangeRequest(BaseModel):
     line_id: str
     direction: str  # "to" or "from"
 
+class MoveListSolutionRequest(BaseModel):
+    # Ordered switch moves and redispatch adjustments, replayed server-side
+    # on the original network instead of submitting the whole network.
+    level: Optional[int] = None  # ignored for the daily problem
+    moves: List[TopologyChangeRequest] = Field(default=[], max_length=1000)
+    adjustments: dict[str, float] = {}
+
 class LoadLevelRequest(BaseModel):
     level_num: int
 
 class NetworkStateRequest(BaseModel):
     network_data: dict
 
+class SolveRequest(BaseModel):
+    network_data: dict
+    # "switching" (best-first search over switches), "redispatch" (cheapest
+    # redispatch for the current topology) or "joint" (both together)
+    mode: str = "switching"
+
 class SwitchNodeRequest(BaseModel):
     network_data: dict
     switch_id: str
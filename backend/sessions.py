@@ -0,0 +1,212 @@
+"""
+Server-side state for live play over /api/play.
+
+A session holds one player's current topology and redispatch for a level
+or the daily problem. The client sends single switch toggles or redispatch
+steps and gets back only the lines whose flow changed. Redispatch steps are
+applied incrementally through the PTDF of the current topology; switches
+re-run the power flow and are diffed against the previous flows.
+
+Sessions are keyed by player, so each player holds at most one. They are
+evicted after SESSION_TTL_SECONDS of inactivity, and least recently used
+first when the store exceeds MAX_SESSIONS or MAX_SESSION_MEMORY_MB.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from .schemas import NetworkState, TopologyChangeRequest
+from .network import (
+    calculate_power_flow,
+    calculate_redispatch_cost,
+    compute_ptdf,
+    update_network,
+)
+
+SESSION_TTL_SECONDS = int(os.environ.get("CONGEST_SESSION_TTL", 15 * 60))
+MAX_SESSIONS = int(os.environ.get("CONGEST_MAX_SESSIONS", 5000))
+MAX_SESSION_MEMORY_MB = int(os.environ.get("CONGEST_MAX_SESSION_MEMORY_MB", 256))
+
+# Rough per-object footprint of a deep-copied pydantic Node/Line plus its
+# dict entries (measured on the shipped levels), used for the memory cap.
+APPROX_ELEMENT_BYTES = 1024
+APPROX_SESSION_BYTES = 4096
+
+# Flow changes below this are not reported to the client.
+FLOW_TOLERANCE = 1e-9
+
+
+class PlaySession:
+    def __init__(self, network: NetworkState):
+        self.network = network
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        # Size last counted towards the store's memory total.
+        self.accounted_bytes = 0
+        self.flows = {line_id: line.flow for line_id, line in network.lines.items()}
+        # PTDF of the current topology, computed on the first redispatch
+        # step and dropped on every switch.
+        self._ptdf = None
+
+    def approx_bytes(self) -> int:
+        size = APPROX_SESSION_BYTES + APPROX_ELEMENT_BYTES * (
+            len(self.network.nodes) + len(self.network.lines)
+        )
+        if self._ptdf is not None:
+            size += self._ptdf.nbytes
+        return size
+
+    def _cost(self) -> float:
+        return sum(
+            max(0.0, abs(self.flows[line_id]) - line.limit)
+            for line_id, line in self.network.lines.items()
+        )
+
+    def _recalculate(self):
+        self.network = calculate_power_flow(self.network)
+        self._ptdf = None
+        self.flows = {line_id: line.flow for line_id, line in self.network.lines.items()}
+
+    def state(self) -> dict:
+        """Full current state, sent when a session starts or resumes."""
+        return {"type": "state", "network": self.network.model_dump()}
+
+    def switch(self, req: TopologyChangeRequest) -> dict:
+        """Apply one switch move and return the resulting flow delta."""
+        if req.direction not in ("to", "from"):
+            raise ValueError(f"Invalid switch direction '{req.direction}'")
+        if req.line_id not in self.network.lines:
+            raise ValueError(f"Line {req.line_id} does not exist in the current topology")
+
+        old_nodes = set(self.network.nodes)
+        old_flows = self.flows
+        try:
+            self.network = update_network(self.network, req)
+        except KeyError as e:
+            raise ValueError(f"Illegal move on line {req.line_id}") from e
+        self._recalculate()
+        network = self.network
+
+        changed = {
+            line_id: flow
+            for line_id, flow in self.flows.items()
+            if line_id not in old_flows or abs(old_flows[line_id] - flow) > FLOW_TOLERANCE
+        }
+        return {
+            "type": "update",
+            "cost": self.network.cost,
+            "flows": changed,
+            "lines_added": {
+                line_id: network.lines[line_id].model_dump()
+                for line_id in self.flows
+                if line_id not in old_flows
+            },
+            "lines_removed": [line_id for line_id in old_flows if line_id not in self.flows],
+            "nodes_added": {
+                node_id: network.nodes[node_id].model_dump()
+                for node_id in network.nodes
+                if node_id not in old_nodes
+            },
+            "nodes_removed": [node_id for node_id in old_nodes if node_id not in network.nodes],
+        }
+
+    def redispatch(self, node_id: str, delta: float) -> dict:
+        """Change one node's injection and return the resulting flow delta."""
+        network = self.network
+        if node_id not in network.nodes or node_id not in network.bus_ids():
+            raise ValueError(f"Cannot redispatch unknown node '{node_id}'")
+
+        network.nodes[node_id].injection += delta
+        adjustments = network.redispatch.setdefault("adjustments", {})
+        adjustments[node_id] = adjustments.get(node_id, 0) + delta
+        if adjustments[node_id] == 0:
+            del adjustments[node_id]
+        network.redispatch["unbalance"] = network.redispatch.get("unbalance", 0.0) + delta
+        network.redispatch["cost"] = calculate_redispatch_cost(network)
+
+        old_flows = self.flows
+        if self._ptdf is None:
+            self._ptdf = compute_ptdf(network)
+        if self._ptdf is None:
+            # Disconnected topology: no PTDF, recompute from scratch.
+            self._recalculate()
+        else:
+            column = self._ptdf[:, list(network.nodes).index(node_id)] * delta
+            self.flows = {
+                line_id: flow + float(column[ell])
+                for ell, (line_id, flow) in enumerate(old_flows.items())
+            }
+            for line_id, flow in self.flows.items():
+                network.lines[line_id].flow = flow
+            network.cost = self._cost()
+
+        changed = {
+            line_id: flow
+            for line_id, flow in self.flows.items()
+            if abs(old_flows[line_id] - flow) > FLOW_TOLERANCE
+        }
+        return {
+            "type": "update",
+            "cost": self.network.cost,
+            "flows": changed,
+            "redispatch": network.redispatch,
+        }
+
+
+class SessionStore:
+    def __init__(self):
+        self._sessions: OrderedDict[int, PlaySession] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, player_id: int) -> PlaySession | None:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(player_id)
+            if session is not None:
+                session.last_seen = time.monotonic()
+                self._sessions.move_to_end(player_id)
+                self._account(session)
+            return session
+
+    def start(self, player_id: int, network: NetworkState) -> PlaySession:
+        """Start (or replace) the player's session on a private copy of `network`."""
+        session = PlaySession(network.model_copy(deep=True))
+        with self._lock:
+            self._remove(player_id)
+            self._sessions[player_id] = session
+            self._account(session)
+            self._evict()
+        return session
+
+    def _account(self, session: PlaySession):
+        size = session.approx_bytes()
+        self._bytes += size - session.accounted_bytes
+        session.accounted_bytes = size
+
+    def _remove(self, player_id: int):
+        session = self._sessions.pop(player_id, None)
+        if session is not None:
+            self._bytes -= session.accounted_bytes
+
+    def _evict(self):
+        # Sessions are kept in least-recently-used order, so expired ones
+        # and eviction candidates are always at the front.
+        cutoff = time.monotonic() - SESSION_TTL_SECONDS
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            self._remove(next(iter(self._sessions)))
+        budget = MAX_SESSION_MEMORY_MB * 1024 * 1024
+        while len(self._sessions) > MAX_SESSIONS or (
+            self._bytes > budget and len(self._sessions) > 1
+        ):
+            self._remove(next(iter(self._sessions)))
+
+
+sessions = SessionStore()
@@ -0,0 +1,62 @@
+"""
+Startup timing and background warm-up.
+
+The server starts listening as soon as the migrations are applied; the
+caches are filled afterwards by a background thread running the warm-up
+steps in order. /readyz reports 503 until every step has finished, so a
+proxy or deploy script can wait for a warm process. Requests arriving
+earlier still work, they just pay for whatever isn't loaded yet.
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Set as early as possible: main.py imports this module first.
+PROCESS_STARTED = time.monotonic()
+
+# step name -> seconds it took, in completion order
+timings: dict[str, float] = {}
+failed: list[str] = []
+_ready = threading.Event()
+
+
+def record(step: str, started: float):
+    timings[step] = round(time.monotonic() - started, 4)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def status() -> dict:
+    return {
+        "ready": is_ready(),
+        "uptime_seconds": round(time.monotonic() - PROCESS_STARTED, 1),
+        "timings": dict(timings),
+        "failed": list(failed),
+    }
+
+
+def start_warmup(steps: list[tuple[str, Callable[[], object]]]):
+    """Run each (name, callable) step in a daemon thread, then mark ready.
+    A failing step is logged and skipped, since the cache it fills is also
+    loaded on demand."""
+
+    def warm():
+        for name, step in steps:
+            started = time.monotonic()
+            try:
+                step()
+            except Exception:
+                logger.exception("Warm-up step %s failed", name)
+                failed.append(name)
+                continue
+            record(name, started)
+        record("ready", PROCESS_STARTED)
+        _ready.set()
+        logger.info("Warm-up finished: %s", ", ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
+
+    threading.Thread(target=warm, name="warm-up", daemon=True).start()
@@ -0,0 +1,66 @@
+"""
+Attempt throttling for login and registration.
+
+Failed logins are counted per username and per client IP in a sliding
+window; once either count reaches its limit, further attempts are refused
+with 429 until old failures age out. Registrations count against the IP.
+Counts are per worker process, which is fine for slowing down password
+guessing but not meant as an exact quota.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+THROTTLE_WINDOW_SECONDS = int(os.environ.get("CONGEST_LOGIN_WINDOW", 15 * 60))
+MAX_FAILURES_PER_USERNAME = int(os.environ.get("CONGEST_LOGIN_MAX_FAILURES_USER", 10))
+MAX_ATTEMPTS_PER_IP = int(os.environ.get("CONGEST_LOGIN_MAX_ATTEMPTS_IP", 50))
+# Keys tracked at once; the least recently seen ones are dropped first.
+MAX_TRACKED_KEYS = 100_000
+
+
+class AttemptLimiter:
+    def __init__(self, limit: int, window: float = THROTTLE_WINDOW_SECONDS):
+        self.limit = limit
+        self.window = window
+        self._attempts: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, now: float) -> deque | None:
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._attempts[key]
+            return None
+        return attempts
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until `key` may try again, 0 if it's not throttled."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._recent(key, now)
+            if attempts is None or len(attempts) < self.limit:
+                return 0
+            return max(1, int(attempts[-self.limit] + self.window - now) + 1)
+
+    def record(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._recent(key, now)
+            if attempts is None:
+                attempts = self._attempts[key] = deque(maxlen=self.limit)
+            attempts.append(now)
+            self._attempts.move_to_end(key)
+            while len(self._attempts) > MAX_TRACKED_KEYS:
+                self._attempts.popitem(last=False)
+
+    def clear(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+username_failures = AttemptLimiter(MAX_FAILURES_PER_USERNAME)
+ip_attempts = AttemptLimiter(MAX_ATTEMPTS_PER_IP)
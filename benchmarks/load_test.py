@@ -0,0 +1,294 @@
+"""
+HTTP load test replaying player sessions against the API.
+
+Starts a local uvicorn on a throwaway SQLite database (or targets --url),
+registers synthetic players and has each of them play sessions in a loop
+for --duration seconds:
+
+    login, /api/me
+    a few times: /api/load_level, one or two failed /api/check_solution
+                 attempts, then the solution (switch moves computed locally)
+    /api/leaderboard, /api/daily_problem
+    occasionally /api/solve
+
+and reports throughput and p50/p95/p99 latency per route. Save a run with
+--json and pass it as --compare to a later run for a before/after table:
+
+    python benchmarks/load_test.py --users 20 --duration 30 --json build/before.json
+    python benchmarks/load_test.py --users 20 --duration 30 --compare build/before.json
+
+The server runs from the repository root, so it uses levels/ and the
+daily network there; only the database is temporary.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+
+from backend.network import read_level_file, solve_network  # noqa: E402
+
+LEVELS_DIR = ROOT / "levels"
+PASSWORD = "load-test-password"
+
+# Chance per session of asking the auto-solver for help.
+SOLVE_PROBABILITY = 0.1
+# Levels played per session.
+LEVELS_PER_SESSION = (1, 3)
+
+
+class Stats:
+    def __init__(self):
+        # route -> latencies (s) and error count
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, route: str, seconds: float, ok: bool):
+        self.latencies.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                "p99_ms": round(_percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {"elapsed": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2), "routes": routes}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Player:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, username: str, solutions: dict):
+        self.client = client
+        self.stats = stats
+        self.username = username
+        self.solutions = solutions
+        self.headers: dict[str, str] = {}
+        self.level = 1
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.add(route, time.perf_counter() - started, False)
+            return None
+        # 429/503 are the server shedding load: counted as errors too.
+        self.stats.add(route, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    async def register(self):
+        r = await self.request(
+            "POST /api/register", "POST", "/api/register",
+            json={"username": self.username, "password": PASSWORD},
+        )
+        if r is not None and r.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    async def session(self, think: float):
+        r = await self.request(
+            "POST /api/login", "POST", "/api/login",
+            json={"username": self.username, "password": PASSWORD},
+        )
+        if r is None or r.status_code != 200:
+            return
+        self.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        await self.request("GET /api/me", "GET", "/api/me")
+
+        for _ in range(random.randint(*LEVELS_PER_SESSION)):
+            await asyncio.sleep(think)
+            level = min(self.level, max(self.solutions))
+            r = await self.request(
+                "POST /api/load_level", "POST", "/api/load_level", json={"level_num": level}
+            )
+            if r is None or r.status_code != 200:
+                break
+            network = r.json()
+            # Wrong attempts first, then the solution.
+            for _ in range(random.randint(0, 2)):
+                await asyncio.sleep(think)
+                await self.request(
+                    "POST /api/check_solution", "POST", "/api/check_solution",
+                    json={"network_data": network},
+                )
+            if random.random() < SOLVE_PROBABILITY:
+                await self.request(
+                    "POST /api/solve", "POST", "/api/solve", json={"network_data": network}
+                )
+            await asyncio.sleep(think)
+            r = await self.request(
+                "POST /api/check_solution", "POST", "/api/check_solution",
+                json={"network_data": self.solutions[level]},
+            )
+            if r is not None and r.status_code == 200 and r.json()["solved"]:
+                self.level = level + 1
+
+        await asyncio.sleep(think)
+        await self.request("GET /api/leaderboard", "GET", "/api/leaderboard")
+        await self.request("GET /api/daily_problem", "GET", "/api/daily_problem")
+
+
+def _level_solutions(count: int) -> dict[int, dict]:
+    """Solved network (switch moves applied) of the first `count` levels."""
+    solutions = {}
+    for level in range(1, count + 1):
+        network = read_level_file(str(LEVELS_DIR / f"Level{level}.json"))
+        solution = solve_network(deepcopy(network))
+        if solution.cost != 0.0:
+            break
+        solutions[level] = solution.model_dump()
+    return solutions
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(tmpdir: str, workers: int, env_overrides: dict) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmpdir}/load_test.db",
+        # Every synthetic player logs in from 127.0.0.1.
+        "CONGEST_LOGIN_MAX_ATTEMPTS_IP": "1000000000",
+        **env_overrides,
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(url: str, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+
+async def run_load(url: str, users: int, duration: float, think: float, solutions: dict) -> dict:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        run_id = f"{int(time.time())}{random.randrange(1000)}"
+        players = [Player(client, stats, f"load{run_id}_{i}", solutions) for i in range(users)]
+        started = time.monotonic()
+        await asyncio.gather(*(p.register() for p in players))
+
+        stop_at = time.monotonic() + duration
+
+        async def play(player: Player):
+            while time.monotonic() < stop_at:
+                await player.session(think)
+
+        await asyncio.gather(*(play(p) for p in players))
+        elapsed = time.monotonic() - started
+    return stats.summary(elapsed)
+
+
+def format_report(summary: dict, baseline: dict | None = None) -> str:
+    header = ["Route", "Requests", "Errors", "Req/s", "p50 ms", "p95 ms", "p99 ms", "Max ms"]
+    if baseline is not None:
+        header += ["p50 before", "p95 before", "p99 before"]
+    rows = [header, ["---"] * len(header)]
+    for route, r in summary["routes"].items():
+        row = [route, r["requests"], r["errors"], r["rps"], r["p50_ms"], r["p95_ms"], r["p99_ms"], r["max_ms"]]
+        if baseline is not None:
+            b = baseline["routes"].get(route)
+            row += [b["p50_ms"], b["p95_ms"], b["p99_ms"]] if b else ["-", "-", "-"]
+        rows.append(row)
+    lines = ["| " + " | ".join(map(str, row)) + " |" for row in rows]
+    lines.append("")
+    lines.append(f"{summary['requests']} requests in {summary['elapsed']}s: {summary['rps']} req/s")
+    if baseline is not None:
+        lines.append(f"before: {baseline['requests']} requests, {baseline['rps']} req/s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--users", type=int, default=20, help="concurrent players")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between actions (s)")
+    parser.add_argument("--levels", type=int, default=5, help="levels the players progress through")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the local server")
+    parser.add_argument("--bcrypt-rounds", type=int, help="CONGEST_BCRYPT_ROUNDS of the local server")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", type=Path, help="write the summary here")
+    parser.add_argument("--compare", type=Path, help="summary of an earlier run to compare with")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    solutions = _level_solutions(args.levels)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+
+    env = {}
+    if args.bcrypt_rounds is not None:
+        env["CONGEST_BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(tmpdir, args.workers, env)
+        try:
+            asyncio.run(wait_ready(url))
+            summary = asyncio.run(run_load(url, args.users, args.duration, args.think, solutions))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    summary["settings"] = {
+        "users": args.users,
+        "duration": args.duration,
+        "think": args.think,
+        "levels": args.levels,
+        "workers": args.workers,
+        "url": args.url or "local",
+    }
+    print(format_report(summary, baseline))
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(summary, indent=1))
+
+
+if __name__ == "__main__":
+    main()
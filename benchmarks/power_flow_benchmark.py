@@ -0,0 +1,339 @@
+"""
+Power flow micro-benchmark and equivalence harness.
+
+Builds networks from levels/, the snapshots in saves/ and synthetic grids
+of 10 to 5000 nodes, then for every implementation in IMPLEMENTATIONS:
+
+- checks the flows and cost against reference_power_flow (the plain dense
+  DC power flow) within a tolerance,
+- measures calls per second and the peak memory allocated per call.
+
+It also times update_network and the _get_node_switch_states expansion the
+solver does per node, and checks every candidate it yields against the
+reference. On networks of at least FACTOR_CACHE_MIN_NODES nodes it checks
+that a repeated calculate_power_flow on the same topology is served from
+the factor cache (this needs metrics enabled). Register a new power flow implementation in IMPLEMENTATIONS
+before swapping it into the solver.
+
+    python benchmarks/power_flow_benchmark.py
+    python benchmarks/power_flow_benchmark.py --sizes 10,100,1000 --no-files
+    python benchmarks/power_flow_benchmark.py --json build/power_flow.json
+
+The dense method allocates about 0.7 GB per call at 5000 nodes. Exits with status 1
+if any implementation disagrees with the reference.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from backend import metrics, network as net  # noqa: E402
+from backend.schemas import (  # noqa: E402
+    Line,
+    NetworkState,
+    Node,
+    TopologyChangeRequest,
+    dict_to_network_state,
+)
+
+LEVELS_DIR = ROOT / "levels"
+SAVES_DIR = ROOT / "saves"
+
+DEFAULT_SIZES = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+SEED = 1234
+
+# Flows may differ by this much (MW, absolute plus relative to the flow).
+ABS_TOLERANCE = 1e-6
+REL_TOLERANCE = 1e-9
+
+# Each case is timed for at least this long (and at least MIN_CALLS calls).
+MIN_SECONDS = 0.2
+MIN_CALLS = 3
+
+# Nodes whose switch states are expanded per network.
+SWITCH_SAMPLE_NODES = 5
+
+
+def reference_power_flow(network: NetworkState) -> tuple[dict[str, float], float]:
+    """Flows by line id and total overload of `network`, by the textbook
+    dense method: incidence matrix A, B = A A^T, slack at the first node.
+    Returns ({}, nan) if the network is disconnected."""
+    ids = list(network.nodes)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    lines = list(network.lines.values())
+    A = np.zeros((len(ids), len(lines)))
+    for ell, line in enumerate(lines):
+        A[index[line.from_node], ell] = 1
+        A[index[line.to_node], ell] = -1
+    if not net.is_connected(network):
+        return {}, float("nan")
+    p = np.array([network.nodes[node_id].injection for node_id in ids])
+    theta = np.zeros(len(ids))
+    theta[1:] = np.linalg.solve((A @ A.T)[1:, 1:], p[1:])
+    flows = A.T @ theta
+    flow_by_id = {line.id: float(f) for line, f in zip(lines, flows)}
+    cost = sum(max(0.0, abs(flow_by_id[line.id]) - line.limit) for line in lines)
+    return flow_by_id, cost
+
+
+def _backend_power_flow(network: NetworkState) -> tuple[dict[str, float], float]:
+    state = net.calculate_power_flow(network)
+    return {line_id: line.flow for line_id, line in state.lines.items()}, state.cost
+
+
+# name -> function(network) returning (flows by line id, cost). Must not
+# depend on state left behind by a previous call on the same network.
+IMPLEMENTATIONS = {
+    "calculate_power_flow": _backend_power_flow,
+}
+
+
+def synthetic_grid(num_nodes: int, seed: int) -> NetworkState:
+    """Planar grid built like the level generator (Delaunay, pruned edges,
+    balanced injections) without the force layout and solvability checks,
+    which would dominate at thousands of nodes."""
+    from scipy.spatial import Delaunay
+
+    rng = random.Random(seed)
+    random.seed(seed)  # reduce_edges shuffles with the global generator
+    points = np.array([(rng.random() * 500, rng.random() * 500) for _ in range(num_nodes)])
+    edges = set()
+    for a, b, c in Delaunay(points).simplices:
+        for u, v in ((a, b), (b, c), (a, c)):
+            edges.add((int(min(u, v)), int(max(u, v))))
+
+    injections = [rng.uniform(-100, 100) for _ in range(num_nodes)]
+    mean = sum(injections) / num_nodes
+    nodes = {
+        str(i): Node(id=str(i), x=float(x), y=float(y), injection=injections[i] - mean)
+        for i, (x, y) in enumerate(points)
+    }
+    lines = {
+        f"L{u}-{v}": Line(id=f"L{u}-{v}", from_node=str(u), to_node=str(v), limit=net.DEFAULT_LINE_LIMIT)
+        for u, v in sorted(edges)
+    }
+    return net.reduce_edges(NetworkState(nodes=nodes, lines=lines))
+
+
+def load_networks(sizes, include_files: bool) -> list[tuple[str, str, NetworkState]]:
+    """(group, name, network) for every benchmark case."""
+    cases = []
+    if include_files:
+        levels = sorted(LEVELS_DIR.glob("Level*.json"), key=lambda p: int(p.stem[5:]))
+        for path in levels:
+            cases.append(("level", path.stem, net.read_level_file(str(path))))
+        for path in sorted(SAVES_DIR.glob("*.json")):
+            with open(path) as f:
+                cases.append(("save", path.stem, dict_to_network_state(json.load(f))))
+    for size in sizes:
+        cases.append(("grid", f"grid_{size}", synthetic_grid(size, SEED + size)))
+    return cases
+
+
+def _time_calls(fn, *args) -> float:
+    """Calls per second of fn(*args)."""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(*args)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if calls >= MIN_CALLS and elapsed >= MIN_SECONDS:
+            return calls / elapsed
+
+
+def _peak_memory(fn, *args) -> int:
+    """Peak bytes allocated during one fn(*args) call."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _max_difference(flows: dict, cost: float, ref_flows: dict, ref_cost: float) -> float:
+    """Largest flow difference relative to the tolerance; > 1 fails."""
+    if math.isnan(ref_cost):
+        # Split into islands: the reference has no flows, but the state
+        # must carry a finite, non-zero penalty.
+        return 0.0 if math.isfinite(cost) and cost > 0 else math.inf
+    if flows.keys() != ref_flows.keys():
+        return math.inf
+    worst = abs(cost - ref_cost) / (ABS_TOLERANCE + REL_TOLERANCE * abs(ref_cost))
+    for line_id, ref in ref_flows.items():
+        allowed = ABS_TOLERANCE + REL_TOLERANCE * abs(ref)
+        worst = max(worst, abs(flows[line_id] - ref) / allowed)
+    return worst
+
+
+def _switch_cases(network: NetworkState, rng: random.Random) -> list[str]:
+    buses = network.bus_ids()
+    return rng.sample(buses, min(SWITCH_SAMPLE_NODES, len(buses)))
+
+
+def _expand(network: NetworkState, node_ids: list[str]) -> list[NetworkState]:
+    return [candidate for node_id in node_ids for _, candidate in net._get_node_switch_states(network, node_id)]
+
+
+def _toggle(network: NetworkState, line_id: str, switched_id: str):
+    # Switch a line away at its to-end and back: the network ends up as it
+    # started, so it can be timed in a loop.
+    net.update_network(network, TopologyChangeRequest(line_id=line_id, direction="to"))
+    net.update_network(network, TopologyChangeRequest(line_id=switched_id, direction="to"))
+
+
+def _switched_id(network: NetworkState, line_id: str) -> str:
+    """Id `line_id` gets when its to-end is switched."""
+    copy = deepcopy(network)
+    index = copy.lines[line_id].index
+    net.update_network(copy, TopologyChangeRequest(line_id=line_id, direction="to"))
+    return next(line.id for line in copy.lines.values() if line.index == index)
+
+
+def _factor_cache_hits(network: NetworkState) -> int:
+    """Factor cache hits of two power flows of `network` from a cold cache."""
+    with net._factor_cache_lock:
+        net._factor_cache.clear()
+        net._factor_cache_bytes = 0
+    before = net.FACTOR_CACHE_HITS.value()
+    net.calculate_power_flow(deepcopy(network))
+    net.calculate_power_flow(deepcopy(network))
+    return int(net.FACTOR_CACHE_HITS.value() - before)
+
+
+def run_case(group: str, name: str, network: NetworkState, switch_states: bool) -> dict:
+    ref_flows, ref_cost = reference_power_flow(network)
+    result = {
+        "group": group,
+        "name": name,
+        "nodes": len(network.nodes),
+        "lines": len(network.lines),
+        "connected": not math.isnan(ref_cost),
+        "implementations": {},
+    }
+    for impl_name, impl in IMPLEMENTATIONS.items():
+        copy = deepcopy(network)
+        flows, cost = impl(copy)
+        result["implementations"][impl_name] = {
+            "calls_per_second": round(_time_calls(impl, copy), 2),
+            "peak_bytes": _peak_memory(impl, copy),
+            "max_difference": _max_difference(flows, cost, ref_flows, ref_cost),
+        }
+    result["reference_calls_per_second"] = round(_time_calls(reference_power_flow, network), 2)
+    if result["connected"] and len(network.nodes) >= net.FACTOR_CACHE_MIN_NODES and metrics.ENABLED:
+        result["factor_cache_hits"] = _factor_cache_hits(network)
+
+    # update_network: one switch and back, on an unswitched line whose
+    # to-bus has no switched ends yet (so the b node is created each time).
+    switched_buses = {
+        bus for line in network.lines.values()
+        for node_id, bus in ((line.from_node, line.from_bus), (line.to_node, line.to_bus))
+        if node_id != bus
+    }
+    plain = [
+        line_id for line_id, line in network.lines.items()
+        if line.from_node == line.from_bus and line.to_node == line.to_bus
+        and line.to_bus not in switched_buses
+    ]
+    if plain:
+        copy = deepcopy(network)
+        switched = _switched_id(copy, plain[0])
+        result["toggles_per_second"] = round(_time_calls(_toggle, copy, plain[0], switched), 2)
+
+    if switch_states:
+        node_ids = _switch_cases(network, random.Random(SEED))
+        candidates = _expand(network, node_ids)
+        worst = 0.0
+        for candidate in candidates:
+            flows, cost = IMPLEMENTATIONS["calculate_power_flow"](deepcopy(candidate))
+            worst = max(worst, _max_difference(flows, cost, *reference_power_flow(candidate)))
+        rate = _time_calls(_expand, network, node_ids)
+        result["switch_states"] = {
+            "nodes": len(node_ids),
+            "candidates": len(candidates),
+            "candidates_per_second": round(rate * len(candidates), 2),
+            "max_difference": worst,
+        }
+    return result
+
+
+def _format_table(results: list[dict]) -> str:
+    names = list(IMPLEMENTATIONS)
+    header = ["Case", "Nodes", "Lines", "Reference calls/s"]
+    for impl_name in names:
+        header += [f"{impl_name} calls/s", "KiB/call", "Max diff"]
+    header += ["Toggles/s", "Switch candidates/s"]
+    rows = [header, ["---"] * len(header)]
+    for r in results:
+        row = [r["name"], str(r["nodes"]), str(r["lines"]), f"{r['reference_calls_per_second']:.1f}"]
+        for impl_name in names:
+            impl = r["implementations"][impl_name]
+            row += [
+                f"{impl['calls_per_second']:.1f}",
+                f"{impl['peak_bytes'] / 1024:.0f}",
+                f"{impl['max_difference']:.2g}",
+            ]
+        row.append(f"{r['toggles_per_second']:.0f}" if "toggles_per_second" in r else "-")
+        switch = r.get("switch_states")
+        row.append(f"{switch['candidates_per_second']:.0f}" if switch else "-")
+        rows.append(row)
+    return "\n".join("| " + " | ".join(row) + " |" for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="synthetic grid sizes (nodes), comma separated")
+    parser.add_argument("--no-files", action="store_true", help="skip levels/ and saves/")
+    parser.add_argument("--no-switch-states", action="store_true",
+                        help="skip the _get_node_switch_states measurement")
+    parser.add_argument("--json", type=Path, help="also write the raw results here")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = []
+    for group, name, network in load_networks(sizes, not args.no_files):
+        # Expanding nodes of large grids builds thousands of deep copies.
+        switch_states = not args.no_switch_states and len(network.nodes) <= 200
+        started = time.perf_counter()
+        results.append(run_case(group, name, network, switch_states))
+        print(f"{name}: {time.perf_counter() - started:.1f}s", file=sys.stderr, flush=True)
+
+    print(_format_table(results))
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(results, indent=1))
+
+    failures = [
+        f"{r['name']}: {impl_name}"
+        for r in results
+        for impl_name, impl in r["implementations"].items()
+        if impl["max_difference"] > 1
+    ] + [
+        f"{r['name']}: switch states"
+        for r in results
+        if r.get("switch_states", {}).get("max_difference", 0) > 1
+    ] + [
+        f"{r['name']}: repeated power flow missed the factor cache"
+        for r in results
+        if r.get("factor_cache_hits") == 0
+    ]
+    for failure in failures:
+        print("MISMATCH", failure, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
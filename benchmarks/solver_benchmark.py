@@ -0,0 +1,270 @@
+"""
+Solver benchmark over every level in levels/.
+
+Solves each level with solve_network and (unless --skip-state-space)
+explores its state space with evaluate_all_solutions, several levels in
+parallel. Writes the raw results as JSON, regenerates solver_benchmark.md
+and solver_state_space.md, and compares against a stored baseline.
+
+    python benchmarks/solver_benchmark.py                  # run and compare
+    python benchmarks/solver_benchmark.py --save-baseline  # accept results
+    python benchmarks/solver_benchmark.py --levels 1-37 --skip-state-space
+
+Expansions and solution depth are deterministic and compared exactly;
+times are compared with a relative tolerance since they depend on the
+machine and its load. Exits with status 1 if a regression is found.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from backend import metrics, network as net  # noqa: E402
+
+# Expansions and depth are read from the solver metrics.
+metrics.ENABLED = True
+
+LEVELS_DIR = ROOT / "levels"
+BASELINE_PATH = ROOT / "benchmarks" / "solver_baseline.json"
+RESULTS_PATH = ROOT / "build" / "solver_benchmark.json"
+SOLVE_TABLE_PATH = ROOT / "solver_benchmark.md"
+STATE_SPACE_TABLE_PATH = ROOT / "solver_state_space.md"
+
+SEED = 1234
+
+# Regression thresholds for times: slower by this fraction and by at least
+# MIN_TIME_DELTA seconds.
+TIME_TOLERANCE = 0.5
+MIN_TIME_DELTA = 0.05
+
+
+def _level_numbers(spec: str | None) -> list[int]:
+    available = sorted(
+        int(m.group(1))
+        for p in LEVELS_DIR.glob("Level*.json")
+        if (m := re.fullmatch(r"Level(\d+)\.json", p.name))
+    )
+    if spec is None:
+        return available
+    wanted = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        wanted.update(range(int(first), int(last or first) + 1))
+    return [n for n in available if n in wanted]
+
+
+def _metric_total(delta: dict, name: str, labels: tuple = ()) -> float:
+    value = delta.get(name, {}).get(labels, 0)
+    return value[-1] if isinstance(value, list) else value  # histogram: sum
+
+
+def _solve_level(level: int, timeout: float) -> dict:
+    random.seed(SEED)
+    np.random.seed(SEED)
+    net.SOLVER_TIMEOUT_SECONDS = timeout
+    network = net.read_level_file(str(LEVELS_DIR / f"Level{level}.json"))
+
+    before = metrics.snapshot()
+    started = time.perf_counter()
+    solution = net.solve_network(network, label_difficulty=True)
+    elapsed = time.perf_counter() - started
+    delta = metrics.changes_since(before)
+
+    solved = solution.cost == 0.0
+    return {
+        "level": level,
+        "time": round(elapsed, 4),
+        "solved": solved,
+        "cost": round(solution.cost, 3),
+        "switches": net._count_switches(solution),
+        "depth": int(_metric_total(delta, "congest_solver_solution_depth")) if solved else None,
+        "difficulty": solution.difficulty,
+        "expanded": int(_metric_total(delta, "congest_solver_states_expanded_total", ("solve",))),
+        "power_flows": int(_metric_total(delta, "congest_power_flow_calls_total")),
+    }
+
+
+def _evaluate_level(level: int, timeout: float) -> dict:
+    random.seed(SEED)
+    np.random.seed(SEED)
+    # evaluate_all_solutions runs for 3x the solver timeout.
+    net.SOLVER_TIMEOUT_SECONDS = timeout / 3
+    network = net.read_level_file(str(LEVELS_DIR / f"Level{level}.json"))
+
+    started = time.perf_counter()
+    allowed, winning, exhaustive = net.evaluate_all_solutions(network)
+    elapsed = time.perf_counter() - started
+    return {
+        "level": level,
+        "time": round(elapsed, 4),
+        "allowed": allowed,
+        "winning": winning,
+        "exhaustive": exhaustive,
+    }
+
+
+def run(levels: list[int], workers: int, solve_timeout: float, state_timeout: float | None) -> dict:
+    results = {"solve": {}, "state_space": {}}
+    jobs = [(_solve_level, "solve", n, solve_timeout) for n in levels]
+    if state_timeout is not None:
+        jobs += [(_evaluate_level, "state_space", n, state_timeout) for n in levels]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(fn, n, timeout): (kind, n) for fn, kind, n, timeout in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            kind, n = futures[future]
+            result = future.result()
+            results[kind][str(n)] = result
+            print(f"[{done:3d}/{len(jobs)}] {kind:11s} level {n:3d}  {result['time']:.3f}s", flush=True)
+
+    return {
+        "meta": {
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "workers": workers,
+            "solve_timeout": solve_timeout,
+            "state_space_timeout": state_timeout,
+            "seed": SEED,
+        },
+        **results,
+    }
+
+
+def _sorted(results: dict) -> list[dict]:
+    return [results[k] for k in sorted(results, key=int)]
+
+
+def solve_table(results: dict) -> str:
+    rows = _sorted(results)
+    lines = [
+        "| Level | Time (s) | Switches | Difficulty (depth) | Expanded | Final Cost |",
+        "|-------|----------|----------|---------------------|----------|------------|",
+    ]
+    for r in rows:
+        depth = r["depth"] if r["depth"] is not None else "-"
+        lines.append(
+            f"| {r['level']} | {r['time']:.3f} | {r['switches']} | {depth} | {r['expanded']} | {r['cost']:.3f} |"
+        )
+    solved = [r for r in rows if r["solved"]]
+    total = sum(r["time"] for r in rows)
+    lines.append(f"| **Total** | **{total:.3f}** | | | | |")
+    if solved:
+        lines.append(
+            f"| **Average** | **{total / len(rows):.3f}** "
+            f"| **{sum(r['switches'] for r in solved) / len(solved):.1f}** "
+            f"| **{sum(r['depth'] for r in solved) / len(solved):.1f}** "
+            f"| **{sum(r['expanded'] for r in solved) / len(solved):.0f}** | |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def state_space_table(results: dict) -> str:
+    lines = [
+        "| Level | Winning/Allowed States | Ratio | Exhaustive | Time (s) |",
+        "|-------|-------------------------|-------|------------|----------|",
+    ]
+    for r in _sorted(results):
+        ratio = r["winning"] / r["allowed"] if r["allowed"] else 0.0
+        exhaustive = "yes" if r["exhaustive"] else "NO (timed out)"
+        lines.append(
+            f"| {r['level']} | {r['winning']}/{r['allowed']} | {ratio:.2%} | {exhaustive} | {r['time']:.3f} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _slower(now: float, base: float) -> bool:
+    return now > base * (1 + TIME_TOLERANCE) and now - base > MIN_TIME_DELTA
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Human-readable regressions of `current` against `baseline`."""
+    problems = []
+    for key, r in current["solve"].items():
+        b = baseline.get("solve", {}).get(key)
+        if b is None:
+            continue
+        level = f"level {key}"
+        if b["solved"] and not r["solved"]:
+            problems.append(f"{level}: no longer solved (cost {r['cost']})")
+            continue
+        if _slower(r["time"], b["time"]):
+            problems.append(f"{level}: solve time {b['time']:.3f}s -> {r['time']:.3f}s")
+        if r["solved"] and b["solved"]:
+            if r["expanded"] > b["expanded"]:
+                problems.append(f"{level}: expanded {b['expanded']} -> {r['expanded']} states")
+            if r["depth"] > b["depth"]:
+                problems.append(f"{level}: solution depth {b['depth']} -> {r['depth']}")
+    for key, r in current["state_space"].items():
+        b = baseline.get("state_space", {}).get(key)
+        if b is None:
+            continue
+        level = f"level {key}"
+        if b["exhaustive"] and not r["exhaustive"]:
+            problems.append(f"{level}: state space no longer explored exhaustively")
+        elif b["exhaustive"] and r["winning"] != b["winning"]:
+            problems.append(f"{level}: winning states {b['winning']} -> {r['winning']}")
+        elif b["exhaustive"] and _slower(r["time"], b["time"]):
+            problems.append(f"{level}: state space time {b['time']:.3f}s -> {r['time']:.3f}s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--levels", help="e.g. 1-37 or 1,5,10-12 (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=net.SOLVER_TIMEOUT_SECONDS,
+                        help="solve_network timeout per level (s)")
+    parser.add_argument("--state-space-timeout", type=float, default=3 * net.SOLVER_TIMEOUT_SECONDS,
+                        help="evaluate_all_solutions timeout per level (s)")
+    parser.add_argument("--skip-state-space", action="store_true")
+    parser.add_argument("--json", type=Path, default=RESULTS_PATH, help="raw results output")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--no-tables", action="store_true", help="don't rewrite the .md tables")
+    args = parser.parse_args()
+
+    levels = _level_numbers(args.levels)
+    state_timeout = None if args.skip_state_space else args.state_space_timeout
+    results = run(levels, args.workers, args.timeout, state_timeout)
+
+    args.json.parent.mkdir(parents=True, exist_ok=True)
+    args.json.write_text(json.dumps(results, indent=1))
+    print(f"Results written to {args.json}")
+    if not args.no_tables:
+        SOLVE_TABLE_PATH.write_text(solve_table(results["solve"]))
+        if results["state_space"]:
+            STATE_SPACE_TABLE_PATH.write_text(state_space_table(results["state_space"]))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=1))
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    problems = compare(results, json.loads(args.baseline.read_text()))
+    for problem in problems:
+        print("REGRESSION", problem)
+    if problems:
+        sys.exit(1)
+    print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
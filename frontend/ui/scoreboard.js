@@ -1,6 +1,12 @@
+import { authHeaders } from '../auth/auth.js';
+
 const TOTAL_LEVELS = 100;
+// Rows per /api/leaderboard request; "Show more" fetches the next page.
+const PAGE_SIZE = 100;
 
 let leaderboardData = [];
+// True while the last page came back full, i.e. there may be more players.
+let hasMore = false;
 let sortState = { col: 'daily_streak', dir: 'desc' };
 
 function sortData() {
@@ -28,9 +34,9 @@ function renderRows() {
   const tbody = document.getElementById('leaderboardBody');
   tbody.innerHTML = '';
 
-  sortData().forEach((entry, i) => {
+  sortData().forEach(entry => {
     const isMe = entry.username === player?.username;
-    const rank = i + 1;
+    const rank = entry.rank;
     const medal = rank === 1 ? '🥇' : rank === 2 ? '🥈' : rank === 3 ? '🥉' : rank;
     const solvedLevels = entry.unlocked_levels - 1; // unlocked = solved + 1
     const campaign = `${solvedLevels}/${TOTAL_LEVELS}`;
@@ -52,6 +58,35 @@ function renderRows() {
     `;
     tbody.appendChild(tr);
   });
+
+  if (hasMore) {
+    const tr = document.createElement('tr');
+    tr.innerHTML = '<td colspan="6" class="px-5 py-3 text-center"><button class="text-blue-400 hover:text-blue-300">Show more</button></td>';
+    tr.querySelector('button').addEventListener('click', () => loadPage(true).catch(() => {}));
+    tbody.appendChild(tr);
+  }
+}
+
+// Fetch the next page (or the first one), ranked by the server. A player
+// outside the loaded pages is added with their own rank from /leaderboard/me.
+async function loadPage(more) {
+  const player = JSON.parse(sessionStorage.getItem('player'));
+  const loaded = more ? leaderboardData.filter(entry => !entry.outsidePage) : [];
+  const res = await fetch(`/api/leaderboard?limit=${PAGE_SIZE}&offset=${loaded.length}`, { headers: authHeaders() });
+  if (!res.ok) throw new Error(res.status);
+  const page = await res.json();
+  page.forEach((entry, i) => { entry.rank = loaded.length + i + 1; });
+  leaderboardData = loaded.concat(page);
+  hasMore = page.length === PAGE_SIZE;
+
+  if (player && !leaderboardData.some(entry => entry.username === player.username)) {
+    const meRes = await fetch('/api/leaderboard/me', { headers: authHeaders() });
+    if (meRes.ok) {
+      const me = await meRes.json();
+      leaderboardData.push({ ...me.player, rank: me.rank, outsidePage: true });
+    }
+  }
+  if (more) renderRows();
 }
 
 async function fetchAndRender() {
@@ -66,14 +101,7 @@ async function fetchAndRender() {
   tbody.innerHTML = '<tr><td colspan="6" class="px-5 py-10 text-center text-gray-500">Loading…</td></tr>';
 
   try {
-    const res = await fetch('/api/leaderboard', {
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${sessionStorage.getItem('access_token')}`,
-      },
-    });
-    if (!res.ok) throw new Error(res.status);
-    leaderboardData = await res.json();
+    await loadPage(false);
   } catch {
     tbody.innerHTML = '<tr><td colspan="6" class="px-5 py-10 text-center text-red-400">Failed to load leaderboard.</td></tr>';
     return;
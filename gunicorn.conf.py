@@ -0,0 +1,59 @@
+"""
+Multi-worker serving: `gunicorn -c gunicorn.conf.py backend.main:app`
+
+Before forking any worker, the master runs the database migrations,
+makes sure today's daily network exists and, if the network bundle (see
+backend/bundle.py) is missing or out of date, recompiles it. Workers
+memory-map that one file instead of each parsing the levels, and skip the
+migrations at startup.
+
+Precomputed solutions take tens of seconds to solve, so the master never
+builds them: the deploy does (`python -m backend.bundle --solutions`).
+A bundle the master had to recompile has none, and /api/solve solves
+those networks on request instead.
+"""
+import logging
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get("CONGEST_BIND", "127.0.0.1:8001")
+# Each worker also starts a CPU pool process (backend/executors.py) for
+# solves and generation: half as many workers as cores keeps the total
+# number of busy processes around the core count.
+workers = int(os.environ.get("WEB_CONCURRENCY", max(1, multiprocessing.cpu_count() // 2)))
+worker_class = "uvicorn_worker.UvicornWorker"
+raw_env = [
+    "CONGEST_MIGRATIONS_DONE=1",
+    f"CONGEST_CPU_WORKERS={os.environ.get('CONGEST_CPU_WORKERS', 1)}",
+]
+# Solves can take a few seconds; don't kill a worker in the middle of one.
+timeout = 60
+graceful_timeout = 30
+# Recycle workers now and then to return memory fragmented by solves.
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    # Imported here so that `gunicorn --check-config` stays cheap.
+    from backend.bundle import BUNDLE_PATH, build_bundle, is_current
+    from backend.database import engine
+    from backend.migrations import run_migrations
+    from backend.network import get_or_create_daily_network
+
+    logging.basicConfig(level=logging.INFO)
+    start = time.time()
+    run_migrations()
+    # Workers are forked from this process: don't hand them its connections.
+    engine.dispose()
+    get_or_create_daily_network()
+    if is_current():
+        server.log.info("Using network bundle %s", BUNDLE_PATH)
+        return
+    count = build_bundle()
+    server.log.warning(
+        "Compiled %d networks into %s in %.1fs, without precomputed solutions; "
+        "run `python -m backend.bundle --solutions` on deploy to include them",
+        count, BUNDLE_PATH, time.time() - start,
+    )